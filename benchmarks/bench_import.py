@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+"""
+Measure the cost of `import hublib` with python -X importtime (median of
+<runs> fresh interpreters) and list the most expensive imports.
+
+Also checks that importing hublib and using Hub().servers doesn't load
+modules that should only be loaded on first use (e.g., the crypto
+library). Exits non-zero if it does, or if the import takes longer than
+--max-ms, so it can be used as a regression check.
+
+Syntax: bench_import.py [ --max-ms=N ] [ runs ]
+"""
+import os
+import re
+import sys
+import getopt
+import subprocess
+
+TOPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# must not be loaded by import hublib; hublib.Hub().servers
+LAZY_MODULES = ('asyncio', 'Cryptodome', 'concurrent.futures',
+                'hublib.keypacket', 'hublib.backups', 'hublib.appliances',
+                'hublib.asynchub', 'hublib.cache', 'hublib.poller')
+
+IMPORTTIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)$')
+
+def importtime():
+    """Return [(module, self us, cumulative us, depth)] for import hublib,
+    children before their parent (as importtime reports them)"""
+    p = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import hublib'],
+                       cwd=TOPDIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                       universal_newlines=True, check=True)
+
+    modules = []
+    for line in p.stderr.splitlines():
+        m = IMPORTTIME.match(line)
+        if m:
+            modules.append((m.group(4), int(m.group(1)), int(m.group(2)),
+                            (len(m.group(3)) - 1) // 2))
+
+    # drop the interpreter's own startup imports
+    for i in range(len(modules) - 1, -1, -1):
+        if modules[i][0] == 'hublib':
+            start = i
+            while start > 0 and modules[start - 1][3] > 0:
+                start -= 1
+            return modules[start:i + 1]
+
+    raise Exception("import hublib not found in importtime output")
+
+def loaded_lazy_modules():
+    code = ("import sys, hublib; hublib.Hub().servers; "
+            "print('\\n'.join(sys.modules))")
+    p = subprocess.run([sys.executable, '-c', code], cwd=TOPDIR,
+                       stdout=subprocess.PIPE, universal_newlines=True, check=True)
+
+    modules = p.stdout.split()
+    return [ name for name in LAZY_MODULES
+             if name in modules or
+                any([ module.startswith(name + '.') for module in modules ]) ]
+
+def main():
+    opts, args = getopt.gnu_getopt(sys.argv[1:], "", ["max-ms="])
+
+    max_ms = None
+    for opt, val in opts:
+        if opt == '--max-ms':
+            max_ms = float(val)
+
+    runs = int(args[0]) if args else 15
+
+    samples = [ importtime() for i in range(runs) ]
+    totals = sorted([ modules[-1][2] for modules in samples ])
+    median = totals[len(totals) // 2] / 1000.0
+
+    print("import hublib: %.1f ms (median of %d, min %.1f ms)" %
+          (median, runs, totals[0] / 1000.0))
+
+    print("\nslowest imports made by hublib (last run):")
+    top = [ (cumulative, name) for name, own, cumulative, depth in samples[-1]
+            if depth == 1 ]
+    for cumulative, name in sorted(top, reverse=True)[:8]:
+        print("    %-32s %6.1f ms" % (name, cumulative / 1000.0))
+
+    failed = False
+
+    loaded = loaded_lazy_modules()
+    if loaded:
+        print("\nerror: loaded before first use: %s" % ", ".join(loaded))
+        failed = True
+
+    if max_ms is not None and median > max_ms:
+        print("\nerror: import hublib took %.1f ms (max %.1f ms)" % (median, max_ms))
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
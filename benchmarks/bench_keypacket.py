@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+"""
+Benchmark keypacket KDF and cipher rounds against the reference
+implementation (a new AES object per round, as in TKLBAM), and check that
+both produce byte-identical output.
+
+Syntax: bench_keypacket.py [ kilo-repeats ]
+"""
+import os
+import sys
+import time
+import hashlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from hublib import keypacket
+
+def ref_repeat(f, input, count):
+    for x in range(count):
+        input = f(input)
+    return input
+
+def ref_cipher_key(passphrase, repeats):
+    return ref_repeat(lambda k: hashlib.sha256(k).digest(),
+                      passphrase.encode(), repeats)
+
+def ref_encrypt(cipher_key, v, count):
+    return ref_repeat(lambda v: keypacket._cipher(cipher_key).encrypt(v), v, count)
+
+def ref_decrypt(cipher_key, v, count):
+    return ref_repeat(lambda v: keypacket._cipher(cipher_key).decrypt(v), v, count)
+
+def timed(f, *args):
+    started = time.perf_counter()
+    result = f(*args)
+    return time.perf_counter() - started, result
+
+def main():
+    kilo = int(sys.argv[1]) if len(sys.argv) > 1 else keypacket.KILO_REPEATS_HASH
+    repeats = kilo * 1000 + 1
+
+    passphrase = "correct horse battery staple"
+    secret = os.urandom(64)
+    plaintext = keypacket._pad(os.urandom(keypacket.SALT_LEN) +
+                               hashlib.sha1(secret).digest() + secret)
+
+    keypacket._key_cache.clear()
+
+    rows = []
+
+    t_ref, ref_key = timed(ref_cipher_key, passphrase, repeats)
+    t_new, new_key = timed(keypacket._cipher_key, passphrase, repeats)
+    t_cached, cached_key = timed(keypacket._cipher_key, passphrase, repeats)
+    assert ref_key == new_key == cached_key
+    rows.append(("hash chain", t_ref, t_new))
+    rows.append(("hash chain (cached)", t_ref, t_cached))
+
+    t_ref, ref_ct = timed(ref_encrypt, ref_key, plaintext, repeats)
+    t_new, new_ct = timed(keypacket._encrypt_rounds, new_key, plaintext, repeats)
+    assert ref_ct == new_ct
+    rows.append(("encrypt rounds", t_ref, t_new))
+
+    t_ref, ref_pt = timed(ref_decrypt, ref_key, ref_ct, repeats)
+    t_new, new_pt = timed(keypacket._decrypt_rounds, new_key, ref_ct, repeats)
+    assert ref_pt == new_pt == plaintext
+    rows.append(("decrypt rounds", t_ref, t_new))
+
+    packet = keypacket.fmt(secret, passphrase)
+    keypacket._key_cache.clear()
+    t_parse, parsed = timed(keypacket.parse, packet, passphrase)
+    t_parse_cached, parsed = timed(keypacket.parse, packet, passphrase)
+    assert parsed == secret
+
+    print("%d repeats (byte-identical output verified)" % repeats)
+    print("  %-22s %10s %10s %8s" % ("", "reference", "optimized", "speedup"))
+    for name, t_ref, t_new in rows:
+        print("  %-22s %9.3fs %9.3fs %7.1fx" % (name, t_ref, t_new, t_ref / t_new))
+
+    print("  parse(): %.3fs, %.3fs with derived key cached" % (t_parse, t_parse_cached))
+
+if __name__ == "__main__":
+    main()
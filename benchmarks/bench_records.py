@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+"""
+Compare memory held by 10k Server records: the old AttrDict based record
+(kept for reference below) against the slotted Record, with and without
+the raw response.
+
+Syntax: bench_records.py [ count ]
+"""
+import os
+import sys
+import json
+import gc
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from hublib.attrdict import AttrDict
+from hublib.servers import Server
+
+class LegacyServer(AttrDict):
+    def __init__(self, api, response):
+        self.api = api
+        self.raw = response
+        self.instanceid = response['instanceid']
+        self.size = response['type']
+        self.region = response['region']
+        self.ipaddress = response['ipaddress']
+        self.status = response['status']
+        self.boot_status = response['server']['boot_status']
+        self.name = response['server']['name']
+        self.label = response['server']['description']
+        self.type = 'ebs' if response['ebs_backed'] else 's3'
+        AttrDict.__init__(self)
+
+def response(count):
+    return json.dumps([ {'instanceid': 'i-%08x' % i,
+                         'type': 'm1.small',
+                         'region': 'us-east-1',
+                         'ipaddress': '10.%d.%d.%d' % (i >> 16, (i >> 8) & 255, i & 255),
+                         'status': 'running',
+                         'ebs_backed': True,
+                         'server': {'serverid': i,
+                                    'boot_status': 'booted',
+                                    'name': 'core',
+                                    'description': 'server number %d' % i}}
+                        for i in range(count) ])
+
+def measure(count, build):
+    data = response(count)
+
+    gc.collect()
+    tracemalloc.start()
+    records = build(json.loads(data))
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return size, records
+
+def api(method, uri, attrs={}):
+    pass
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    results = [
+        ('AttrDict (old)', lambda r: [ LegacyServer(api, s) for s in r ]),
+        ('slotted, raw=True', lambda r: [ Server(api, s, raw=True) for s in r ]),
+        ('slotted, raw=False', lambda r: [ Server(api, s) for s in r ]),
+    ]
+
+    print("%d records" % count)
+    baseline = None
+    for name, build in results:
+        size, records = measure(count, build)
+        if baseline is None:
+            baseline = size
+        print("  %-20s %8.2f MB  %5.1f%%" % (name, size / 1024.0 / 1024, 100.0 * size / baseline))
+        del records
+
+if __name__ == "__main__":
+    main()
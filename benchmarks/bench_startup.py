@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+"""
+Measure command startup time: each command line is run <runs> times
+without HUB_APIKEY, so it exits right after parsing its arguments.
+Reports the median wall time of each.
+
+Syntax: bench_startup.py [ runs ]
+"""
+import os
+import sys
+import time
+import subprocess
+
+TOPDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+COMMANDS = (
+    ['hub_list_servers.py', '--help'],
+    ['hub.py', 'list-servers', '--help'],
+    ['hub_list_servers.py'],
+    ['hub.py', 'list-servers'],
+    ['hub.py', '--help'],
+)
+
+def median(vals):
+    vals = sorted(vals)
+    return vals[len(vals) // 2]
+
+def bench(argv, runs):
+    env = dict(os.environ)
+    env.pop('HUB_APIKEY', None)
+
+    times = []
+    for i in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(TOPDIR, argv[0])] + argv[1:],
+                       env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - started)
+
+    return median(times)
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    for argv in COMMANDS:
+        print("%-36s %6.1f ms" % (" ".join(argv), bench(argv, runs) * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+"""
+Access the TurnKey Hub from the command line
+
+Syntax: hub <command> [ args ]
+        hub help <command>
+
+Environment variables:
+
+    HUB_APIKEY          Displayed in your Hub account's user profile
+"""
+import os
+import sys
+import importlib
+
+# command -> (module, summary). Only the module of the command that is run
+# gets imported, so the other commands (and hublib) cost nothing.
+COMMANDS = {
+    'launch':           ('hub_launch', "Launch a new cloud server"),
+    'destroy':          ('hub_destroy', "Destroy a cloud server"),
+    'start':            ('hub_start', "Start a stopped EBS backed cloud server"),
+    'stop':             ('hub_stop', "Stop an EBS backed cloud server"),
+    'list-servers':     ('hub_list_servers', "List servers"),
+    'list-backups':     ('hub_list_backups', "List backup records"),
+    'list-appliances':  ('hub_list_appliances', "List appliances"),
+}
+
+def usage(e=None):
+    if e:
+        print("error: " + str(e), file=sys.stderr)
+
+    print(__doc__.strip(), file=sys.stderr)
+    print("\nCommands:\n", file=sys.stderr)
+    for command in sorted(COMMANDS):
+        print("    %-19s %s" % (command, COMMANDS[command][1]), file=sys.stderr)
+
+    sys.exit(1)
+
+def main():
+    args = sys.argv[1:]
+    if not args or args[0] in ('-h', '--help'):
+        usage()
+
+    command = args[0]
+    if command == 'help':
+        if len(args) != 2:
+            usage()
+
+        command = args[1]
+        args = [command, '--help']
+
+    if command not in COMMANDS:
+        usage("no such command '%s'" % command)
+
+    # subcommand modules live next to us (e.g., in /usr/bin)
+    path = os.path.dirname(os.path.realpath(__file__))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+    module = importlib.import_module(COMMANDS[command][0])
+
+    sys.argv = ["%s %s" % (os.path.basename(sys.argv[0]), command)] + args[1:]
+    module.main()
+
+if __name__ == "__main__":
+    main()
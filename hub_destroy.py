@@ -11,16 +11,34 @@
 # option) any later version.
 #
 """
-Destroy a cloud server
+Destroy cloud servers
 
 Arguments:
 
-    instance_id           Instance ID of server to destroy
+    instance_id           Instance ID of server to destroy (- reads instance
+                          IDs from stdin)
 
 Options:
 
+    --parallel=N          Destroy up to N servers at once (default: 8)
+    --status=STATUS       Destroy all servers with this status (e.g., running)
+    --region=REGION       Destroy all servers in this region (e.g., us-east-1)
+    --name=NAME           Destroy all servers of this appliance (e.g., core)
     --disable-unregister  Keep server configuration to re-launched later via
                           Hub
+    --stats               Print a summary of API requests to stderr on exit
+
+    Filter options take a comma separated list of values, and can't be
+    combined with instance IDs.
+
+A row is printed for each server as it finishes. Exits non-zero if any
+server couldn't be destroyed.
+
+Examples:
+
+    hub-destroy i-0123abcd i-4567ef01
+    hub-destroy --status=stopped --region=us-east-1 --parallel=16
+    cut -f1 instances.txt | hub-destroy -
 
 Environment variables:
 
@@ -29,17 +47,18 @@ Environment variables:
 import os
 import sys
 import getopt
+import atexit
 
-from hublib import Hub
+from hublib import Hub, ResponseCache, bulk
 from hublib.formatter import fmt_server_header, fmt_server
-from hublib.utils import fatal
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
     if e:
         print("error: " + str(e), file=sys.stderr)
 
-    print("Syntax: %s <instance_id> [opts]" % (sys.argv[0]), file=sys.stderr)
+    print("Syntax: %s [opts] <instance_id> ..." % (sys.argv[0]), file=sys.stderr)
     print(__doc__, file=sys.stderr)
 
     sys.exit(1)
@@ -48,36 +67,91 @@ def usage(e=None):
 def main():
     try:
         opts, args = getopt.gnu_getopt(sys.argv[1:], "h",
-                                       ["help", "disable-unregister"])
+                                       ["help", "stats", "parallel=",
+                                        "status=", "region=", "name=",
+                                        "disable-unregister"])
     except getopt.GetoptError as e:
         usage(e)
 
+    parallel = bulk.PARALLEL
+    filters = {}
     auto_unregister = True
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
 
+        if opt == '--stats':
+            stats = True
+
+        if opt == '--parallel':
+            if not val.isdigit() or int(val) < 1:
+                usage("--parallel requires a positive number")
+            parallel = int(val)
+
+        if opt in ('--status', '--region', '--name'):
+            filters[opt[2:]] = [ v.strip() for v in val.split(',') if v.strip() ]
+
         if opt == "--disable-unregister":
             auto_unregister = False
 
-    if len(args) != 1:
+    instance_ids = []
+    for arg in args:
+        if arg == '-':
+            instance_ids.extend(sys.stdin.read().split())
+        else:
+            instance_ids.append(arg)
+
+    if args and filters:
+        usage("instance IDs and filter options are mutually exclusive")
+
+    if not args and not filters:
         usage("incorrect number of arguments")
-    instance_id = args[0]
+
+    if args and not instance_ids:
+        fatal("no instance IDs given")
 
     apikey = os.getenv('HUB_APIKEY', None)
     if not apikey:
         fatal("HUB_APIKEY not specified in environment")
 
-    hub = Hub(apikey)
+    # never served from the cache, but drops what list commands cached
+    # about the servers this changes
+    cache = ResponseCache(max_age=0)
+    hub = Hub(apikey, pool_size=max(Hub.POOL_SIZE, parallel), cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
 
     try:
-        server = hub.servers.get(instance_id)[0]
-        server.destroy(auto_unregister=auto_unregister)
+        servers, missing_ids = bulk.select(hub.servers,
+                                           instance_ids if args else None, **filters)
     except hub.Error as e:
         fatal(e.description)
 
-    print(fmt_server_header())
-    print(fmt_server(server))
+    failed = False
+    for instance_id in sorted(missing_ids):
+        print("error: %s: no such server" % instance_id, file=sys.stderr)
+        failed = True
+
+    def destroy(server):
+        server.destroy(auto_unregister=auto_unregister)
+
+    header = True
+    for server, error in bulk.apply(servers, destroy, parallel):
+        if error:
+            print("error: %s: %s" % (server.instanceid,
+                                      getattr(error, 'description', None) or error),
+                  file=sys.stderr, flush=True)
+            failed = True
+            continue
+
+        if header:
+            print(fmt_server_header())
+            header = False
+        print(fmt_server(server), flush=True)
+
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -36,6 +36,8 @@ Options:
     --skip-secalerts   Skip firstboot security updates
     --skip-secupdates  Skip security alerts and notifications setup
 
+    --stats            Print a summary of API requests to stderr on exit
+
 Environment variables:
 
     HUB_APIKEY      Displayed in your Hub account's user profile
@@ -43,10 +45,11 @@ Environment variables:
 import os
 import sys
 import getopt
+import atexit
 
-from hublib import Hub
+from hublib import Hub, ResponseCache
 from hublib.formatter import fmt_server_header, fmt_server
-from hublib.utils import fatal
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
@@ -77,15 +80,19 @@ def main():
     try:
         s_opts = "h"
         l_opts = [key.replace("_", "-") + "=" for key in kwargs]
-        l_opts.extend(["help", "skip-secalerts", "skip-secupdates"])
+        l_opts.extend(["help", "stats", "skip-secalerts", "skip-secupdates"])
         opts, args = getopt.gnu_getopt(sys.argv[1:], s_opts, l_opts)
     except getopt.GetoptError as e:
         usage(e)
 
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
 
+        if opt == '--stats':
+            stats = True
+
         if opt == '--skip-secalerts':
             kwargs['sec_alerts'] = 'SKIP'
             continue
@@ -107,7 +114,12 @@ def main():
         fatal("HUB_APIKEY not specified in environment")
 
     name = args[0]
-    hub = Hub(apikey)
+    # never served from the cache, but drops what list commands cached
+    # about the servers this changes
+    cache = ResponseCache(max_age=0)
+    hub = Hub(apikey, cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
 
     try:
         server = hub.servers.launch(name, **kwargs)
@@ -13,6 +13,14 @@
 """
 List appliances
 
+Options:
+
+    --cached            Reuse a recent response cached by an earlier run
+    --max-age=SECS      Maximum age of a cached response (implies --cached)
+    --output=FORMAT     Print records as jsonl, csv or tsv (one per line)
+    --raw               Include each record's raw API response (with --output)
+    --stats             Print a summary of API requests to stderr on exit
+
 By default uses a built-in format, unless a user-specified format is specified.
 Format variables:
 
@@ -21,6 +29,8 @@ Format variables:
     %description        Appliance descriptive label
     %preseeds           Appliance supported/required preseeding arguments
 
+Variables may be given a format spec, e.g., %{name:<20} or %{version:>12}
+
 Examples:
 
     hub-list-appliances
@@ -33,10 +43,12 @@ Environment variables:
 import os
 import sys
 import getopt
+import atexit
 
-from hublib import Hub
-from hublib.formatter import Formatter, fmt_appliance_header, fmt_appliance
-from hublib.utils import fatal
+from hublib import Hub, ResponseCache
+from hublib.appliances import Appliance
+from hublib.formatter import Formatter, RecordWriter, OUTPUTS, fmt_appliance_header, fmt_appliance
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
@@ -51,14 +63,35 @@ def usage(e=None):
 
 def main():
     try:
-        opts, args = getopt.gnu_getopt(sys.argv[1:], "h", ["help"])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "h",
+                                       ["help", "stats", "cached", "max-age=",
+                                        "output=", "raw"])
     except getopt.GetoptError as e:
         usage(e)
 
-    refresh = False
+    cached = False
+    max_age = None
+    output = None
+    raw = False
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
+        if opt == '--stats':
+            stats = True
+        if opt == '--cached':
+            cached = True
+        if opt == '--max-age':
+            if not val.isdigit():
+                usage("--max-age requires a number of seconds")
+            cached = True
+            max_age = int(val)
+        if opt == '--output':
+            if val not in OUTPUTS:
+                usage("--output must be one of: %s" % ", ".join(OUTPUTS))
+            output = val
+        if opt == '--raw':
+            raw = True
 
     apikey = os.getenv('HUB_APIKEY', None)
     if not apikey:
@@ -72,14 +105,25 @@ def main():
     else:
         format = None
 
-    hub = Hub(apikey)
-    appliances = hub.appliances.get()
+    if raw and not output:
+        usage("--raw requires --output")
+
+    if output and format:
+        usage("--output and a format are mutually exclusive")
+
+    cache = ResponseCache(max_age=max_age) if cached else None
+    hub = Hub(apikey, cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
+    appliances = hub.appliances.get(raw=raw)
     appliances = sorted(appliances, key=lambda appliance: appliance.name)
 
-    if format:
+    if output:
+        writer = RecordWriter(sys.stdout, output, Appliance.FIELDS, raw=raw)
+        writer.writeall(appliances)
+    elif format:
         format = Formatter(format)
-        for appliance in appliances:
-            print(format(appliance))
+        sys.stdout.write(format.render(appliances))
     else:
         print(fmt_appliance_header())
         for appliance in appliances:
@@ -13,6 +13,16 @@
 """
 List backup records
 
+Options:
+
+    --cached            Reuse a recent response cached by an earlier run
+    --max-age=SECS      Maximum age of a cached response (implies --cached)
+    --check-passphrase  Prompt for a passphrase and show whether it unlocks
+                        each backup's key (checked in parallel)
+    --output=FORMAT     Print records as jsonl, csv or tsv (one per line)
+    --raw               Include each record's raw API response (with --output)
+    --stats             Print a summary of API requests to stderr on exit
+
 By default uses a built-in format, unless a user-specified format is specified.
 Format variables:
 
@@ -25,6 +35,11 @@ Format variables:
     %size               Aggregate size of backup, in bytes
     %address            Backup target address
     %skpp               Secret Key Passphrase Protection (bool)
+    %unlocks            Passphrase unlocks backup key (bool, needs
+                        --check-passphrase)
+
+Variables may be given a format spec, e.g., %{backup_id:>4} or
+%{created:%Y-%m-%d}
 
 Examples:
 
@@ -38,10 +53,13 @@ Environment variables:
 import os
 import sys
 import getopt
+import atexit
+import getpass
 
-from hublib import Hub
-from hublib.formatter import Formatter, fmt_backup_header, fmt_backup
-from hublib.utils import fatal
+from hublib import Hub, ResponseCache, keypacket
+from hublib.backups import BackupRecord
+from hublib.formatter import Formatter, RecordWriter, OUTPUTS, fmt_backup_header, fmt_backup
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
@@ -56,13 +74,38 @@ def usage(e=None):
 
 def main():
     try:
-        opts, args = getopt.gnu_getopt(sys.argv[1:], "h", ["help"])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "h",
+                                       ["help", "stats", "cached", "max-age=",
+                                        "check-passphrase", "output=", "raw"])
     except getopt.GetoptError as e:
         usage(e)
 
+    cached = False
+    max_age = None
+    check_passphrase = False
+    output = None
+    raw = False
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
+        if opt == '--stats':
+            stats = True
+        if opt == '--cached':
+            cached = True
+        if opt == '--max-age':
+            if not val.isdigit():
+                usage("--max-age requires a number of seconds")
+            cached = True
+            max_age = int(val)
+        if opt == '--check-passphrase':
+            check_passphrase = True
+        if opt == '--output':
+            if val not in OUTPUTS:
+                usage("--output must be one of: %s" % ", ".join(OUTPUTS))
+            output = val
+        if opt == '--raw':
+            raw = True
 
     if args:
         if len(args) != 1:
@@ -72,22 +115,57 @@ def main():
     else:
         format = None
 
+    if raw and not output:
+        usage("--raw requires --output")
+
+    if output and format:
+        usage("--output and a format are mutually exclusive")
+
     apikey = os.getenv('HUB_APIKEY', None)
     if not apikey:
         fatal("HUB_APIKEY not specified in environment")
 
-    hub = Hub(apikey)
-    backups = hub.backups.get()
-
-    if backups:
-        if format:
-            format = Formatter(format)
-            for backup in backups:
-                print(format(backup))
-        else:
-            print(fmt_backup_header())
-            for backup in backups:
-                print(fmt_backup(backup))
+    cache = ResponseCache(max_age=max_age) if cached else None
+    hub = Hub(apikey, cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
+    if check_passphrase:
+        backups = hub.backups.get(raw=raw)
+        if not backups:
+            return
+
+        passphrase = getpass.getpass("Passphrase: ")
+
+        # rows are printed as each key check completes
+        results = keypacket.verify_many([ backup.key for backup in backups ],
+                                        passphrase)
+        rows = ( (backups[i], unlocks) for i, unlocks in results )
+    else:
+        # rows are printed as records are decoded from the response
+        rows = ( (backup, None) for backup in hub.backups.iter(raw=raw) )
+
+    if output:
+        fields = list(BackupRecord.FIELDS)
+        if check_passphrase:
+            fields.append('unlocks')
+
+        writer = RecordWriter(sys.stdout, output, fields, raw=raw, flush=True)
+        for backup, unlocks in rows:
+            writer.write(backup, unlocks=unlocks)
+    elif format:
+        format = Formatter(format)
+        for backup, unlocks in rows:
+            if unlocks is None:
+                print(format(backup), flush=True)
+            else:
+                print(format(dict(backup.items(), unlocks=unlocks)), flush=True)
+    else:
+        header = True
+        for backup, unlocks in rows:
+            if header:
+                print(fmt_backup_header(unlocks=check_passphrase))
+                header = False
+            print(fmt_backup(backup, unlocks), flush=True)
 
 
 if __name__ == "__main__":
@@ -15,7 +15,24 @@ List servers
 
 Options:
 
-    -r --refresh    Force refresh of Hubs Amazon EC2 cache
+    -r --refresh        Force refresh of Hubs Amazon EC2 cache
+    --cached            Reuse a recent response cached by an earlier run
+    --max-age=SECS      Maximum age of a cached response (implies --cached)
+    --no-sort           Print servers as they arrive, rather than sorted
+                        by status
+    --status=STATUS     Only list servers with this status (e.g., running)
+    --region=REGION     Only list servers in this region (e.g., us-east-1)
+    --name=NAME         Only list servers of this appliance (e.g., core)
+    --watch             Keep polling and print servers as they are added,
+                        removed or change status, boot status or IP address
+                        (+, - and ~ rows, or an event field with --output)
+    --interval=SECS     Longest time between polls with --watch (default: 30).
+                        Polls every 5 seconds while servers are in transition
+    --output=FORMAT     Print records as jsonl, csv or tsv (one per line)
+    --raw               Include each record's raw API response (with --output)
+    --stats             Print a summary of API requests to stderr on exit
+
+    Filter options take a comma separated list of values.
 
 By default uses a built-in format, unless a user-specified format is specified.
 Format variables:
@@ -30,9 +47,14 @@ Format variables:
     %status             Amazon EC2 reported status
     %boot_status        Hub status (sec-updates, tklbam-restore, etc.)
 
+Variables may be given a format spec, e.g., %{status:<10} or %{label:.20}
+
 Examples:
 
     hub-list-servers
+    hub-list-servers --status=running --region=us-east-1,eu-west-1
+    hub-list-servers --no-sort --output=jsonl | jq .ipaddress
+    hub-list-servers -r --watch --interval=60 --output=jsonl
     hub-list-servers "instanceid=%instanceid status=%status
                                         ipaddress=%ipaddress"
 
@@ -42,11 +64,14 @@ Environment variables:
 """
 import os
 import sys
+import time
 import getopt
+import atexit
 
-from hublib import Hub
-from hublib.formatter import Formatter, fmt_server_header, fmt_server
-from hublib.utils import fatal
+from hublib import Hub, ResponseCache
+from hublib.servers import Server
+from hublib.formatter import Formatter, RecordWriter, OUTPUTS, fmt_server_header, fmt_server
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
@@ -59,18 +84,82 @@ def usage(e=None):
     sys.exit(1)
 
 
+WATCH_INTERVAL = 30
+WATCH_FAST_INTERVAL = 5
+
+WATCH_MARKERS = {'added': '+', 'removed': '-', 'changed': '~'}
+
+def print_events(events, output, format, raw):
+    if output:
+        writer = RecordWriter(sys.stdout, output, ('time', 'event') + Server.FIELDS,
+                              raw=raw, flush=True)
+        for event, server in events:
+            writer.write(server, event=event,
+                         time=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        return
+
+    if format:
+        format = Formatter(format)
+    else:
+        print(fmt_server_header(), flush=True)
+
+    for event, server in events:
+        marker = WATCH_MARKERS[event]
+        if format:
+            print("%s %s" % (marker, format(server)), flush=True)
+        else:
+            print(marker + fmt_server(server)[1:], flush=True)
+
+
 def main():
     try:
-        opts, args = getopt.gnu_getopt(sys.argv[1:], "hr", ["help", "refresh"])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "hr",
+                                       ["help", "stats", "refresh", "cached", "max-age=",
+                                        "no-sort", "status=", "region=", "name=",
+                                        "output=", "raw", "watch", "interval="])
     except getopt.GetoptError as e:
         usage(e)
 
     refresh = False
+    cached = False
+    max_age = None
+    sort = True
+    filters = {}
+    output = None
+    raw = False
+    watch = False
+    interval = WATCH_INTERVAL
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
+        if opt == '--stats':
+            stats = True
         if opt in ('-r', '--refresh'):
             refresh = True
+        if opt == '--cached':
+            cached = True
+        if opt == '--max-age':
+            if not val.isdigit():
+                usage("--max-age requires a number of seconds")
+            cached = True
+            max_age = int(val)
+        if opt == '--no-sort':
+            sort = False
+        if opt in ('--status', '--region', '--name'):
+            filters[opt[2:]] = [ v.strip() for v in val.split(',') if v.strip() ]
+        if opt == '--output':
+            if val not in OUTPUTS:
+                usage("--output must be one of: %s" % ", ".join(OUTPUTS))
+            output = val
+        if opt == '--raw':
+            raw = True
+        if opt == '--watch':
+            watch = True
+        if opt == '--interval':
+            if not val.isdigit() or int(val) < 1:
+                usage("--interval requires a number of seconds")
+            interval = int(val)
 
     if args:
         if len(args) != 1:
@@ -80,22 +169,53 @@ def main():
     else:
         format = None
 
+    if raw and not output:
+        usage("--raw requires --output")
+
+    if output and format:
+        usage("--output and a format are mutually exclusive")
+
     apikey = os.getenv('HUB_APIKEY', None)
     if not apikey:
         fatal("HUB_APIKEY not specified in environment")
 
-    hub = Hub(apikey)
-    servers = hub.servers.get(refresh_cache=refresh)
-    if servers:
+    cache = ResponseCache(max_age=max_age) if cached else None
+    hub = Hub(apikey, cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
+
+    if watch:
+        events = hub.servers.watch(interval, min(WATCH_FAST_INTERVAL, interval),
+                                   refresh_cache=refresh, raw=raw, **filters)
+        try:
+            print_events(events, output, format, raw)
+        except KeyboardInterrupt:
+            pass
+        except hub.Error as e:
+            fatal(e.description)
+        return
+
+    servers = hub.servers.iter(refresh_cache=refresh, raw=raw, **filters)
+    if sort:
         servers = sorted(servers, key=lambda server: server.status)
-        if format:
-            format = Formatter(format)
-            for server in servers:
-                print(format(server))
+
+    if output:
+        writer = RecordWriter(sys.stdout, output, Server.FIELDS, raw=raw, flush=not sort)
+        writer.writeall(servers)
+    elif format:
+        format = Formatter(format)
+        if sort:
+            sys.stdout.write(format.render(servers))
         else:
-            print(fmt_server_header())
             for server in servers:
-                print(fmt_server(server))
+                print(format(server), flush=True)
+    else:
+        header = True
+        for server in servers:
+            if header:
+                print(fmt_server_header())
+                header = False
+            print(fmt_server(server), flush=not sort)
 
 
 if __name__ == "__main__":
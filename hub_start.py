@@ -11,30 +11,52 @@
 # option) any later version.
 #
 """
-Start a stopped EBS backed cloud server
+Start stopped EBS backed cloud servers
 
 Arguments:
 
-    instance_id     Instance ID of server to terminate
+    instance_id           Instance ID of server to start (- reads instance
+                          IDs from stdin)
+
+Options:
+
+    --parallel=N          Start up to N servers at once (default: 8)
+    --status=STATUS       Start all servers with this status (e.g., stopped)
+    --region=REGION       Start all servers in this region (e.g., us-east-1)
+    --name=NAME           Start all servers of this appliance (e.g., core)
+    --stats               Print a summary of API requests to stderr on exit
+
+    Filter options take a comma separated list of values, and can't be
+    combined with instance IDs.
+
+A row is printed for each server as it finishes. Exits non-zero if any
+server couldn't be started.
+
+Examples:
+
+    hub-start i-0123abcd i-4567ef01
+    hub-start --status=stopped --region=us-east-1 --parallel=16
+    cut -f1 instances.txt | hub-start -
 
 Environment variables:
 
-    HUB_APIKEY      Displayed in your Hub account's user profile
+    HUB_APIKEY            Displayed in your Hub account's user profile
 """
 import os
 import sys
 import getopt
+import atexit
 
-from hublib import Hub
+from hublib import Hub, ResponseCache, bulk
 from hublib.formatter import fmt_server_header, fmt_server
-from hublib.utils import fatal
+from hublib.utils import fatal, print_stats
 
 
 def usage(e=None):
     if e:
         print("error: " + str(e), file=sys.stderr)
 
-    print("Syntax: %s <instance_id>" % (sys.argv[0]), file=sys.stderr)
+    print("Syntax: %s [opts] <instance_id> ..." % (sys.argv[0]), file=sys.stderr)
     print(__doc__, file=sys.stderr)
 
     sys.exit(1)
@@ -42,32 +64,87 @@ def usage(e=None):
 
 def main():
     try:
-        opts, args = getopt.gnu_getopt(sys.argv[1:], "h", ["help"])
+        opts, args = getopt.gnu_getopt(sys.argv[1:], "h",
+                                       ["help", "stats", "parallel=",
+                                        "status=", "region=", "name="])
     except getopt.GetoptError as e:
         usage(e)
 
+    parallel = bulk.PARALLEL
+    filters = {}
+    stats = False
     for opt, val in opts:
         if opt in ('-h', '--help'):
             usage()
 
-    if len(args) != 1:
+        if opt == '--stats':
+            stats = True
+
+        if opt == '--parallel':
+            if not val.isdigit() or int(val) < 1:
+                usage("--parallel requires a positive number")
+            parallel = int(val)
+
+        if opt in ('--status', '--region', '--name'):
+            filters[opt[2:]] = [ v.strip() for v in val.split(',') if v.strip() ]
+
+    instance_ids = []
+    for arg in args:
+        if arg == '-':
+            instance_ids.extend(sys.stdin.read().split())
+        else:
+            instance_ids.append(arg)
+
+    if args and filters:
+        usage("instance IDs and filter options are mutually exclusive")
+
+    if not args and not filters:
         usage("incorrect number of arguments")
-    instance_id = args[0]
+
+    if args and not instance_ids:
+        fatal("no instance IDs given")
 
     apikey = os.getenv('HUB_APIKEY', None)
     if not apikey:
         fatal("HUB_APIKEY not specified in environment")
 
-    hub = Hub(apikey)
+    # never served from the cache, but drops what list commands cached
+    # about the servers this changes
+    cache = ResponseCache(max_age=0)
+    hub = Hub(apikey, pool_size=max(Hub.POOL_SIZE, parallel), cache=cache)
+    if stats:
+        atexit.register(print_stats, hub)
 
     try:
-        server = hub.servers.get(instance_id)[0]
-        server.start()
+        servers, missing_ids = bulk.select(hub.servers,
+                                           instance_ids if args else None, **filters)
     except hub.Error as e:
         fatal(e.description)
 
-    print(fmt_server_header())
-    print(fmt_server(server))
+    failed = False
+    for instance_id in sorted(missing_ids):
+        print("error: %s: no such server" % instance_id, file=sys.stderr)
+        failed = True
+
+    def start(server):
+        server.start()
+
+    header = True
+    for server, error in bulk.apply(servers, start, parallel):
+        if error:
+            print("error: %s: %s" % (server.instanceid,
+                                      getattr(error, 'description', None) or error),
+                  file=sys.stderr, flush=True)
+            failed = True
+            continue
+
+        if header:
+            print(fmt_server_header())
+            header = False
+        print(fmt_server(server), flush=True)
+
+    if failed:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
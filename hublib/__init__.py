@@ -9,38 +9,220 @@
 # Free Software Foundation; either version 3 of the License, or (at your
 # option) any later version.
 #
-from .appliances import Appliances
-from .servers import Servers
-from .backups import Backups
+from .transport import CurlPool, iter_json_array
+from .attrdict import AttrDict
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+from .metrics import Metrics
 
 import time
+import json
+import importlib
+
+import pycurl
 
 from py3curl_wrapper import API
 
+# loaded on first use (see __getattr__), so that e.g. listing servers
+# doesn't pay for importing asyncio or the crypto library
+_LAZY = {
+    'Appliances': 'appliances',
+    'Servers': 'servers',
+    'ServerCollection': 'servers',
+    'Backups': 'backups',
+    'AsyncHub': 'asynchub',
+    'StatusPoller': 'poller',
+    'ListPoller': 'poller',
+    'ResponseCache': 'cache',
+    'RateLimiter': 'ratelimit',
+    'LifecycleEvent': 'lifecycle',
+    'BootLatency': 'lifecycle',
+}
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError("module '%s' has no attribute '%s'" % (__name__, name))
+
+    module = importlib.import_module('.' + _LAZY[name], __name__)
+    return getattr(module, name)
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
+
 class Hub(object):
     Error = API.Error
 
     """Top-level object to access the TurnKey Hub API"""
     API_URL = 'https://hub.turnkeylinux.org/api/'
 
-    def __init__(self, apikey=None, timeout=None, verbose=False):
+    POOL_SIZE = 4
+
+    def __init__(self, apikey=None, timeout=None, verbose=False, pool_size=POOL_SIZE, retry=None, cache=None, ratelimit=None, coalesce=True, metrics_sink=None):
+        """If a RetryPolicy is given as <retry>, API calls are retried by it.
+        If a ResponseCache is given as <cache>, GET responses are cached in it
+        and invalidated by mutating calls.
+        If a RateLimiter is given as <ratelimit>, every request sent to the Hub
+        (including retries, but not cache hits) waits for it.
+        If <coalesce>, a GET that is identical to one already in flight waits
+        for and shares its response (see singleflight.stats()).
+        Every request sent is recorded in self.metrics (see stats()), and
+        passed to <metrics_sink>, if given (see Metrics)"""
         headers = {}
         if apikey:
             headers['apikey'] = apikey
 
-        _api = API(timeout=timeout, verbose=verbose)
-        def api(method, uri, attrs={}):
-            return _api.request(method, self.API_URL + uri, attrs, headers)
+        self.transport = CurlPool(size=pool_size, timeout=timeout, verbose=verbose)
+        self.retry = retry
+        self.cache = cache
+        self.ratelimit = ratelimit
+        self.singleflight = SingleFlight() if coalesce else None
+        self.metrics = Metrics(metrics_sink)
+
+        def send(method, uri, attrs):
+            if self.ratelimit:
+                self.ratelimit.acquire(method)
+
+            info = {}
+            error = None
+            started = time.time()
+            try:
+                return self.transport.request(method, self.API_URL + uri, attrs,
+                                              headers, info)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.metrics.record(method, uri, time.time() - started,
+                                    info.get('bytes_in', 0), info.get('bytes_out', 0),
+                                    error)
+
+        def send_stream(method, uri, attrs):
+            if self.ratelimit:
+                self.ratelimit.acquire(method)
+
+            info = {}
+            error = None
+            started = time.time()
+            try:
+                chunks = self.transport.stream(method, self.API_URL + uri, attrs,
+                                               headers, info)
+                for val in iter_json_array(chunks):
+                    yield val
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self.metrics.record(method, uri, time.time() - started,
+                                    info.get('bytes_in', 0), info.get('bytes_out', 0),
+                                    error)
+
+        def request(method, uri, attrs):
+            if not self.retry:
+                return send(method, uri, attrs)
+
+            return self.retry.call(send, (method, uri, attrs),
+                                   idempotent=self.retry.idempotent(method))
+
+        namespace = self.API_URL + (apikey or '')
+        def get(uri, attrs):
+            def fetch():
+                if not self.cache:
+                    return request('GET', uri, attrs)
+                return self.cache.fetch(namespace, uri, attrs,
+                                        lambda: request('GET', uri, attrs))
+
+            if not self.singleflight:
+                return fetch()
+
+            # concurrent callers share the response, so don't modify it
+            key = (uri, json.dumps(attrs, sort_keys=True, default=str))
+            return self.singleflight.call(key, fetch)
+
+        def api(method, uri, attrs={}, stream=False):
+            """If <stream>, return an iterator over the elements of a JSON
+            array response, decoded as they arrive. Streamed requests that
+            miss the cache aren't retried, as elements may have been yielded"""
+            if stream and not self.cache:
+                return send_stream(method, uri, attrs)
+
+            if method == 'GET':
+                response = get(uri, attrs)
+            elif not self.cache:
+                response = request(method, uri, attrs)
+            else:
+                try:
+                    response = request(method, uri, attrs)
+                finally:
+                    self.cache.invalidate(namespace, uri)
+
+            return iter(response) if stream else response
+
+        self.api = api
+
+        self._appliances = None
+        self._servers = None
+        self._backups = None
+
+    def stats(self):
+        """Return request metrics by endpoint (see Metrics.stats) along with
+        connection, request coalescing and rate limiter stats"""
+        stats = {'endpoints': self.metrics.stats(),
+                 'connections': self.transport.stats()}
 
-        self.appliances = Appliances(api)
-        self.servers = Servers(api)
-        self.backups = Backups(api)
+        if self.singleflight:
+            stats['coalesced'] = self.singleflight.stats()['coalesced']
+
+        if self.ratelimit:
+            stats['ratelimit'] = self.ratelimit.stats()
+
+        return stats
+
+    @property
+    def appliances(self):
+        if self._appliances is None:
+            from .appliances import Appliances
+            self._appliances = Appliances(self.api)
+        return self._appliances
+
+    @property
+    def servers(self):
+        if self._servers is None:
+            from .servers import Servers
+            self._servers = Servers(self.api)
+        return self._servers
+
+    @property
+    def backups(self):
+        if self._backups is None:
+            from .backups import Backups
+            self._backups = Backups(self.api)
+        return self._backups
+
+class DestroyResult(AttrDict):
+    """Outcome of destroying one address (see Spawner.destroy_many)"""
+
+    DESTROYED = 'destroyed'
+    GONE = 'gone'
+    NOT_FOUND = 'not_found'
+    FAILED = 'failed'
+
+    def __repr__(self):
+        return "<DestroyResult: %s (%s)>" % (self.instanceid, self.status)
+
+    def __init__(self, status, server=None, error=None):
+        self.status = status
+        self.instanceid = server.instanceid if server else None
+        self.ipaddress = server.ipaddress if server else None
+        self.error = error
+
+        AttrDict.__init__(self)
 
 class Spawner:
     """A high-level synchronous instance spawner that wraps around the Hub class"""
 
     WAIT_STATUS_FIRST = 25
     WAIT_STATUS = 10
+    WAIT_STATUS_MAX = 60
     WAIT_RETRY = 5
 
     API_RETRIES = 3
@@ -48,57 +230,133 @@ class Spawner:
 
     PENDING_TIMEOUT = 300
 
+    LAUNCH_PARALLEL = 1
+    DESTROY_PARALLEL = 4
+
+    CALLBACK_INTERVAL = 1
+
     class Error(Exception):
         pass
 
     class Stopped(Error):
         pass
 
-    def __init__(self, apikey, wait_status_first=WAIT_STATUS_FIRST, wait_status=WAIT_STATUS, wait_retry=WAIT_RETRY, api_retries=API_RETRIES, api_timeout=API_TIMEOUT):
+    class NotFound(Error):
+        pass
+
+    def __init__(self, apikey, wait_status_first=WAIT_STATUS_FIRST, wait_status=WAIT_STATUS, wait_retry=WAIT_RETRY, api_retries=API_RETRIES, api_timeout=API_TIMEOUT, launch_parallel=LAUNCH_PARALLEL, destroy_parallel=DESTROY_PARALLEL, retry=None, ratelimit=None, events=None, wait_status_max=WAIT_STATUS_MAX):
+        """<retry> is a RetryPolicy. By default one is built from wait_retry and api_retries.
+        <ratelimit> is an optional RateLimiter for the Hub's API requests.
+        <events> is called with a LifecycleEvent at each step of a launched or
+        destroyed instance's life (e.g., a BootLatency)"""
 
-        self.hub = Hub(apikey, timeout=api_timeout)
+        # leave a pooled connection free for status polling
+        pool_size = max(Hub.POOL_SIZE, launch_parallel + 1, destroy_parallel)
+        self.hub = Hub(apikey, timeout=api_timeout, pool_size=pool_size,
+                       ratelimit=ratelimit)
+
+        self.launch_parallel = launch_parallel
+        self.destroy_parallel = destroy_parallel
 
         self.wait_status_first = wait_status_first
         self.wait_status = wait_status
+        self.wait_status_max = wait_status_max
         self.wait_retry = wait_retry
 
         self.api_retries = api_retries
 
-    def _retry(self, callable, *args, **kwargs):
-        for i in range(self.api_retries + 1):
-            try:
-                return callable(*args, **kwargs)
-            except self.hub.Error as e:
-                if e.name == 'HubAccount.InvalidApiKey':
-                    raise self.Error(e)
+        if retry is None:
+            retry = RetryPolicy(retries=api_retries, backoff=wait_retry)
+        self.retry = retry
+
+        self.events = events
 
-                if e.name == 'BackupRecord.NotFound':
-                    raise self.Error(e)
+    def _emit(self, type, server=None, **kwargs):
+        if self.events:
+            from .lifecycle import LifecycleEvent
+            self.events(LifecycleEvent(type, server, **kwargs))
 
-                time.sleep(self.wait_retry)
+    def _retry(self, callable, *args, **kwargs):
+        try:
+            return self.retry.call(callable, args, kwargs)
+        except (self.hub.Error, pycurl.error) as e:
+            raise self.Error(e)
 
-        raise self.Error(e)
+    def _retry_nonidempotent(self, callable, *args, **kwargs):
+        try:
+            return self.retry.call(callable, args, kwargs, idempotent=False)
+        except (self.hub.Error, pycurl.error) as e:
+            raise self.Error(e)
 
     def launch(self, name, howmany, logfh=None, callback=None, **kwargs):
         """launch <howmany> workers, wait until booted and yield (ipaddress, instanceid) tuples
         Invoke callback every frequently. If callback returns False, we terminate launching.
+
+        If launch_parallel > 1, up to that many launch requests are kept in flight at once.
+
+        Only pending instances are polled, each on its own schedule (see StatusPoller).
+
+        Each launch request, status transition, boot, failure and destruction
+        is reported to the events hook, if any.
         """
 
+        from concurrent import futures
+        from .poller import StatusPoller
+        from .lifecycle import LifecycleEvent
+
         retry = self._retry
+        emit = self._emit
 
         pending_ids = set()
         yielded_ids = set()
 
-        time_start = time.time()
-        wait_status = self.wait_status_first
+        # launch requests are numbered, to match them with their outcome
+        requests = 0
+
+        # instanceid -> last seen server, polls since its last transition, total polls
+        seen = {}
+        polls = {}
+        total_polls = {}
+
+        poller = StatusPoller(self.hub.servers, self.wait_status_first,
+                              self.wait_status, self.wait_status_max, retry)
 
         def get_pending_servers():
-            if not pending_ids:
-                return []
+            servers, missing_ids = poller.fetch(pending_ids - yielded_ids)
+            return servers
+
+        def forget(instanceid):
+            pending_ids.remove(instanceid)
+            poller.remove(instanceid)
+
+            seen.pop(instanceid, None)
+            polls.pop(instanceid, None)
+            total_polls.pop(instanceid, None)
+
+        def request_launch():
+            nonlocal requests
+
+            requests += 1
+            emit(LifecycleEvent.LAUNCH_REQUESTED, request=requests, name=name,
+                 region=kwargs.get('region'), size=kwargs.get('size'))
+            return requests
+
+        def launch_request():
+            server = self._retry_nonidempotent(self.hub.servers.launch, name, **kwargs)
+            return server, time.monotonic()
+
+        def observe(server):
+            """count a poll of <server>, reporting any change of its status"""
+            instanceid = server.instanceid
+            polls[instanceid] += 1
+            total_polls[instanceid] += 1
+
+            last = seen[instanceid]
+            if (server.status, server.boot_status) != (last.status, last.boot_status):
+                emit(LifecycleEvent.TRANSITION, server, polls=polls[instanceid])
+                polls[instanceid] = 0
 
-            return [ server
-                     for server in retry(self.hub.servers.get, refresh_cache=True)
-                     if server.instanceid in (pending_ids - yielded_ids) ]
+            seen[instanceid] = server
 
         def log(s):
             if logfh:
@@ -109,93 +367,289 @@ class Spawner:
         launch_failure = None
         launch_failure_pending = None
 
-        while True:
+        executor = None
+        if self.launch_parallel > 1:
+            executor = futures.ThreadPoolExecutor(self.launch_parallel)
+        inflight = {}
 
-            if callback and not stopped:
-                if callback() is False:
-                    stopped = time.time()
-                    log("launch stopped, destroying pending instances...")
+        def launched(server, request, acked):
+            nonlocal launch_failure_pending
 
-            if stopped:
-                servers = [ server for server in get_pending_servers() ]
+            pending_ids.add(server.instanceid)
+            poller.add(server.instanceid)
+            log("booting instance %s ..." % server.instanceid)
 
-                for server in servers:
-                    if server.status == 'running':
-                        retry(server.destroy, auto_unregister=True)
-                        pending_ids.remove(server.instanceid)
-                        log("destroyed instance %s" % server.instanceid)
+            seen[server.instanceid] = server
+            polls[server.instanceid] = 0
+            total_polls[server.instanceid] = 0
+            emit(LifecycleEvent.LAUNCHED, server, time=acked, request=request)
 
-                    elif server.status in ('stopped', 'terminated'):
-                        pending_ids.remove(server.instanceid)
+            # launches still in flight when another failed are waited for too
+            if launch_failure:
+                launch_failure_pending += 1
 
-                    elif server.status == 'pending' and \
-                       (time.time() - stopped > self.PENDING_TIMEOUT):
-                        raise self.Error("stuck pending instance")
+        def launch_failed(e, request):
+            nonlocal launch_failure, launch_failure_pending
 
-                if not pending_ids or not servers:
-                    raise self.Stopped
-                else:
-                    time.sleep(self.wait_status)
+            emit(LifecycleEvent.FAILED, request=request, name=name, error=e)
+
+            if pending_ids:
+                log("failed to launch instance, waiting for %d pending instances" % len(pending_ids))
+            else:
+                log("failed to launch instance")
 
-                continue
+            if not launch_failure:
+                launch_failure = e
+                launch_failure_pending = len(pending_ids)
 
-            if len(pending_ids) < howmany and not launch_failure:
+        def harvest(timeout):
+            """wait up to <timeout> seconds for in-flight launches to complete"""
+            done, not_done = futures.wait(inflight, timeout=timeout,
+                                          return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                request = inflight.pop(future)
                 try:
-                    server = retry(self.hub.servers.launch, name, **kwargs)
-                    pending_ids.add(server.instanceid)
-                    log("booting instance %s ..." % server.instanceid)
+                    server, acked = future.result()
                 except Exception as e:
+                    launch_failed(e, request)
+                else:
+                    launched(server, request, acked)
+
+        def sleep(seconds):
+            if inflight:
+                harvest(seconds)
+            else:
+                time.sleep(seconds)
+
+        def wait_next():
+            # sleep until the next poll is due, waking early for the callback
+            next_due = poller.next_due()
+            if next_due is None:
+                timeout = self.wait_status
+            else:
+                timeout = max(0, next_due - time.time())
+
+            if callback:
+                timeout = min(timeout, self.CALLBACK_INTERVAL)
+
+            if not executor and len(pending_ids) < howmany and not launch_failure:
+                timeout = 0
+
+            sleep(timeout)
+
+        try:
+            while True:
+
+                if callback and not stopped:
+                    if callback() is False:
+                        stopped = time.time()
+                        log("launch stopped, destroying pending instances...")
+
+                if stopped:
+                    if inflight:
+                        harvest(0)
 
-                    if pending_ids:
-                        log("failed to launch instance, waiting for %d pending instances" % len(pending_ids))
+                    servers = [ server for server in get_pending_servers() ]
+
+                    for server in servers:
+                        if server.status == 'running':
+                            retry(server.destroy, auto_unregister=True)
+                            forget(server.instanceid)
+                            log("destroyed instance %s" % server.instanceid)
+                            emit(LifecycleEvent.DESTROYED, server)
+
+                        elif server.status in ('stopped', 'terminated'):
+                            forget(server.instanceid)
+
+                        elif server.status == 'pending' and \
+                           (time.time() - stopped > self.PENDING_TIMEOUT):
+                            raise self.Error("stuck pending instance")
+
+                    if not inflight and (not pending_ids or not servers):
+                        raise self.Stopped
+                    else:
+                        sleep(self.wait_status)
+
+                    continue
+
+                if executor:
+                    while not launch_failure and len(inflight) < self.launch_parallel and \
+                          len(pending_ids) + len(inflight) < howmany:
+                        request = request_launch()
+                        inflight[executor.submit(launch_request)] = request
+
+                elif len(pending_ids) < howmany and not launch_failure:
+                    request = request_launch()
+                    try:
+                        server, acked = launch_request()
+                    except Exception as e:
+                        launch_failed(e, request)
                     else:
-                        log("failed to launch instance")
+                        launched(server, request, acked)
 
-                    launch_failure = e
-                    launch_failure_pending = len(pending_ids)
+                if launch_failure and not inflight and len(yielded_ids) == launch_failure_pending:
+                    raise launch_failure
 
-            if launch_failure and len(yielded_ids) == launch_failure_pending:
-                raise launch_failure
+                if poller.due():
+                    pending_servers, missing_ids = poller.poll()
 
-            if (time.time() - time_start) >= wait_status:
-                pending_servers = get_pending_servers()
+                    for missing_id in missing_ids:
+                        emit(LifecycleEvent.FAILED, seen.get(missing_id), instanceid=missing_id,
+                             polls=total_polls.get(missing_id),
+                             error=self.Error("instance %s disappeared" % missing_id))
+                        forget(missing_id)
 
-                missing_ids = pending_ids - yielded_ids - set([ server.instanceid for server in pending_servers ])
-                for missing_id in missing_ids:
-                    pending_ids.remove(missing_id)
+                    for server in pending_servers:
+                        observe(server)
 
-                for server in pending_servers:
-                    if server.status in ('stopped', 'terminated'):
-                        pending_ids.remove(server.instanceid)
-                        continue
+                        if server.status in ('stopped', 'terminated'):
+                            emit(LifecycleEvent.FAILED, server, polls=total_polls[server.instanceid],
+                                 error=self.Error("instance %s %s" % (server.instanceid, server.status)))
+                            forget(server.instanceid)
+                            continue
 
-                    if server.status != 'running' or server.boot_status != 'booted':
-                        continue
+                        if server.status != 'running' or server.boot_status != 'booted':
+                            continue
+
+                        emit(LifecycleEvent.BOOTED, server, polls=total_polls[server.instanceid])
+
+                        yielded_ids.add(server.instanceid)
+                        poller.remove(server.instanceid)
+                        yield (server.ipaddress, server.instanceid)
 
-                    yielded_ids.add(server.instanceid)
-                    yield (server.ipaddress, server.instanceid)
+                    if len(yielded_ids) == howmany:
+                        break
 
-                if len(yielded_ids) == howmany:
-                    break
+                wait_next()
 
-                wait_status = self.wait_status
-                time_start = time.time()
+        finally:
+            # servers launched but not yet yielded never will be, so they are
+            # destroyed rather than left running. Queued launches are
+            # cancelled, and those in flight are waited for
+            abandoned_ids = pending_ids - yielded_ids
 
-            time.sleep(0.2)
+            if executor:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+                for future, request in inflight.items():
+                    if future.cancelled():
+                        emit(LifecycleEvent.FAILED, request=request, name=name,
+                             error=futures.CancelledError())
+                        continue
+
+                    try:
+                        server, acked = future.result()
+                    except Exception as e:
+                        emit(LifecycleEvent.FAILED, request=request, name=name, error=e)
+                        continue
+
+                    emit(LifecycleEvent.LAUNCHED, server, time=acked, request=request)
+                    abandoned_ids.add(server.instanceid)
+
+            if abandoned_ids:
+                try:
+                    results = self.destroy_many(abandoned_ids)
+                except self.Error as e:
+                    log("failed to destroy abandoned instances (%s): %s" %
+                        (" ".join(sorted(abandoned_ids)), e))
+                else:
+                    for instanceid, result in sorted(results.items()):
+                        if result.status == DestroyResult.DESTROYED:
+                            log("destroyed abandoned instance %s" % instanceid)
+                        elif result.status == DestroyResult.FAILED:
+                            log("failed to destroy abandoned instance %s: %s" %
+                                (instanceid, result.error))
 
     def destroy(self, *addresses):
         """destroy addresses. An address can be an IP or an instance-id.
-        Return a list of destroyed (ipaddress, instanceid) tuples"""
+        Return a list of destroyed (ipaddress, instanceid) tuples.
+
+        Raises Spawner.NotFound, once the others are destroyed, if an
+        address matches no server"""
         if not addresses:
             return
 
-        retry = self._retry
+        results = self.destroy_many(addresses)
+
+        failed = [ result for result in results.values()
+                   if result.status == DestroyResult.FAILED ]
+        if failed:
+            error = failed[0].error
+            raise error if isinstance(error, self.Error) else self.Error(error)
+
+        not_found = [ address for address in addresses
+                      if results[address].status == DestroyResult.NOT_FOUND ]
+        if not_found:
+            raise self.NotFound("no such server: %s" % " ".join(not_found))
+
+        destroyed = []
+        for address in addresses:
+            result = results[address]
+            if result.status == DestroyResult.DESTROYED and \
+               (result.ipaddress, result.instanceid) not in destroyed:
+                destroyed.append((result.ipaddress, result.instanceid))
 
-        destroyable = [ server
-                        for server in retry(self.hub.servers.get, refresh_cache=True)
-                        if (server.ipaddress in addresses) or (server.instanceid in addresses) ]
+        return destroyed
 
-        for server in destroyable:
-            retry(server.destroy, auto_unregister=True)
+    def destroy_many(self, addresses, parallel=None):
+        """destroy addresses concurrently, at most <parallel> (default: destroy_parallel) at a time.
+        An address can be an IP or an instance-id.
 
-        return [ (server.ipaddress, server.instanceid) for server in destroyable ]
+        Return a dict mapping each address to a DestroyResult. A failure to destroy one server
+        is recorded in its result and doesn't stop the others from being destroyed.
+        An address that matches no server is NOT_FOUND, whereas one that is already
+        terminated (or disappears while being destroyed) is GONE."""
+
+        from concurrent import futures
+        from .lifecycle import LifecycleEvent
+
+        results = {}
+        if not addresses:
+            return results
+
+        servers = self._retry(self.hub.servers.get, refresh_cache=True,
+                              addresses=addresses)
+
+        def destroy(server):
+            try:
+                server.destroy(auto_unregister=True)
+            except self.hub.Error as e:
+                if e.code != 404:
+                    raise
+                return DestroyResult.GONE
+
+            return DestroyResult.DESTROYED
+
+        def destroy_result(server):
+            try:
+                return DestroyResult(self._retry(destroy, server), server)
+            except Exception as e:
+                return DestroyResult(DestroyResult.FAILED, server, e)
+
+        # several addresses may refer to the same server
+        destroyable = {}
+        for address in addresses:
+            server = servers.find(address)
+            if server is None:
+                results[address] = DestroyResult(DestroyResult.NOT_FOUND)
+            elif server.status == 'terminated':
+                results[address] = DestroyResult(DestroyResult.GONE, server)
+            else:
+                destroyable.setdefault(server.instanceid, []).append(address)
+
+        if not destroyable:
+            return results
+
+        with futures.ThreadPoolExecutor(parallel or self.destroy_parallel) as executor:
+            fs = dict([ (executor.submit(destroy_result, servers.by_instanceid[instanceid]), addresses)
+                        for instanceid, addresses in destroyable.items() ])
+
+            for future in futures.as_completed(fs):
+                result = future.result()
+                if result.status == DestroyResult.DESTROYED:
+                    self._emit(LifecycleEvent.DESTROYED, servers.by_instanceid[result.instanceid])
+
+                for address in fs[future]:
+                    results[address] = result
+
+        return results
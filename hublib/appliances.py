@@ -8,29 +8,36 @@
 # Free Software Foundation; either version 3 of the License, or (at your
 # option) any later version.
 # 
-from .attrdict import AttrDict
+from .record import Record
+
+class Appliance(Record):
+    FIELDS = ('name', 'version', 'description', 'preseeds')
+    __slots__ = FIELDS + ('raw',)
 
-class Appliance(AttrDict):
     def __repr__(self):
         return "<Appliance: %s>" % self.name
 
-    def __init__(self, response):
-        self.raw = response
+    def __init__(self, response, raw=False):
+        self.raw = response if raw else None
         self.name = response['name']
         self.version = response['version']
         self.description = response['description']
         self.preseeds = response['preseeds']
 
-        AttrDict.__init__(self)
-
 class Appliances(object):
     def __init__(self, api):
         self.api = api
 
-    def get(self, name=None):
+    def get(self, name=None, raw=False):
+        """If <raw>, appliances keep their raw API response"""
         if name:
             r = self.api('GET', 'amazon/appliance/%s/' % name)
         else:
             r = self.api('GET', 'amazon/appliances/')
 
-        return [ Appliance(appliance) for appliance in r ]
+        return [ Appliance(appliance, raw) for appliance in r ]
+
+    def iter(self, raw=False):
+        """Like get(), but yield appliances as the response is decoded"""
+        for appliance in self.api('GET', 'amazon/appliances/', stream=True):
+            yield Appliance(appliance, raw)
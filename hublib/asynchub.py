@@ -0,0 +1,429 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import sys
+import ssl
+import time
+import weakref
+import asyncio
+
+from urllib.parse import urlsplit, urlencode
+
+from py3curl_wrapper import API
+
+from .transport import decode_response
+from .servers import Server, Servers, ServerCollection, _reached, _wait_poll, _wait_timeout
+from .poller import _by_instanceid
+from .backups import BackupRecord
+from .appliances import Appliance
+
+class AsyncAPI(object):
+    """Minimal asyncio HTTP/1.1 client speaking the same protocol as
+    py3curl_wrapper.API (form encoded attrs, JSON responses, errors as
+    "Name: description" bodies)"""
+
+    Error = API.Error
+
+    USER_AGENT = 'hubtools'
+
+    def __init__(self, timeout=None, verbose=False, limit=10):
+        self.timeout = timeout
+        self.verbose = verbose
+        self.limit = limit
+
+        # idle connections and the semaphore belong to the event loop they
+        # were made in, so they are replaced when used from another loop
+        self._loop = None
+        self._idle = {}
+        self._sem = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._idle = {}
+            self._sem = asyncio.Semaphore(self.limit)
+
+    def _log(self, s):
+        if self.verbose:
+            print("* " + s, file=sys.stderr)
+
+    async def _connect(self, scheme, host, port):
+        key = (scheme, host, port)
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+
+        sslctx = ssl.create_default_context() if scheme == 'https' else None
+        reader, writer = await asyncio.open_connection(host, port, ssl=sslctx)
+        self._log("connected to %s:%d" % (host, port))
+        return reader, writer, False
+
+    def _release(self, scheme, host, port, reader, writer, keepalive):
+        if keepalive:
+            self._idle.setdefault((scheme, host, port), []).append((reader, writer))
+        else:
+            writer.close()
+
+    # responses that never have a body (RFC 9112, section 6.3)
+    NO_BODY = (204, 304)
+
+    @classmethod
+    async def _read_body(cls, reader, method, code, headers, keepalive):
+        if method == 'HEAD' or 100 <= code < 200 or code in cls.NO_BODY:
+            return b''
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # discard trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            return b''.join(chunks)
+
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+
+        # only a connection that is closed after the response can delimit it
+        if not keepalive:
+            return await reader.read()
+
+        return b''
+
+    async def _roundtrip(self, scheme, host, port, method, request):
+        reader, writer, reused = await self._connect(scheme, host, port)
+        try:
+            writer.write(request)
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line and reused:
+                # server closed an idle keep-alive connection on us
+                writer.close()
+                reader, writer, reused = await self._connect(scheme, host, port)
+                writer.write(request)
+                await writer.drain()
+                status_line = await reader.readline()
+
+            if not status_line:
+                raise ConnectionError("connection closed by %s" % host)
+
+            version, code = status_line.split(None, 2)[:2]
+            code = int(code)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, val = line.decode('latin-1').split(':', 1)
+                headers[name.strip().lower()] = val.strip()
+
+            keepalive = version == b'HTTP/1.1' and \
+                        headers.get('connection', '').lower() != 'close'
+
+            body = await self._read_body(reader, method, code, headers, keepalive)
+
+        except BaseException:
+            writer.close()
+            raise
+
+        self._release(scheme, host, port, reader, writer, keepalive)
+
+        return code, body
+
+    async def request(self, method, url, attrs={}, headers={}):
+        u = urlsplit(url)
+        port = u.port or (443 if u.scheme == 'https' else 80)
+        path = u.path or '/'
+
+        data = urlencode(attrs)
+        body = b''
+        # same as CurlPool: GET and DELETE attrs go in the query string
+        if method in ('GET', 'DELETE'):
+            if data:
+                path += '?' + data
+        else:
+            body = data.encode()
+
+        lines = [ "%s %s HTTP/1.1" % (method, path),
+                  "Host: %s" % u.netloc,
+                  "User-Agent: %s" % self.USER_AGENT,
+                  "Accept: application/json",
+                  "Content-Length: %d" % len(body) ]
+        if method not in ('GET', 'DELETE'):
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        lines.extend([ "%s: %s" % (name, val) for name, val in headers.items() ])
+
+        request = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+        self._log("%s %s" % (method, url))
+
+        self._bind()
+        async with self._sem:
+            code, data = await asyncio.wait_for(
+                self._roundtrip(u.scheme, u.hostname, port, method, request),
+                self.timeout)
+
+        self._log("response code %d" % code)
+
+        return decode_response(code, data)
+
+    async def close(self):
+        idle = self._idle
+        self._idle = {}
+
+        # connections made in another loop went with it
+        if self._loop is not asyncio.get_running_loop():
+            return
+
+        writers = [ writer for conns in idle.values() for reader, writer in conns ]
+        for writer in writers:
+            writer.close()
+
+        for writer in writers:
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+class AsyncServer(Server):
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<AsyncServer: %s (%s, %s)>" % (self.name, self.instanceid, self.status)
+
+    async def update(self):
+        attrs = {'refresh_cache': True}
+        r = await self.api('GET', 'amazon/instance/%s/' % self.instanceid, attrs)
+        self._parse_response(r[0])
+
+    async def wait_for(self, status='running', boot_status=None, timeout=None, **kwargs):
+        """Wait until this server has <status> (and <boot_status>, if given).
+        See Servers.wait_each for arguments and errors"""
+        await AsyncServers(self.api).wait_all([self], status, boot_status, timeout, **kwargs)
+        return self
+
+    async def reboot(self):
+        r = await self.api('PUT', 'amazon/instance/%s/reboot/' % self.instanceid)
+        self._parse_response(r)
+
+    async def destroy(self, auto_unregister=True):
+        """Destroy cloud server and unregister from Hub by default"""
+        r = await self.api('PUT',
+                           'amazon/instance/%s/terminate/' % self.instanceid,
+                           {'auto_unregister': auto_unregister})
+        self._parse_response(r)
+
+    async def stop(self):
+        r = await self.api('PUT', 'amazon/instance/%s/stop/' % self.instanceid)
+        self._parse_response(r)
+
+    async def start(self):
+        r = await self.api('PUT', 'amazon/instance/%s/start/' % self.instanceid)
+        self._parse_response(r)
+
+    async def unregister(self):
+        await self.api('DELETE', 'amazon/instance/%s/unregister/' % self.instanceid)
+
+    async def set_boot_status(self, boot_status):
+        attrs = {'serverid': self.serverid}
+        await self.api('PUT', 'server/status/%s/' % boot_status, attrs)
+
+        self.boot_status = boot_status
+
+class AsyncListPoller(object):
+    """asyncio counterpart of ListPoller: waiters on one account share a
+    single amazon/instances/ refresh per tick, awaiting the one in flight
+    if it started no earlier than they need"""
+
+    _shared = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def shared(cls, api):
+        """Return the poller shared by every user of <api>"""
+        poller = cls._shared.get(api)
+        if poller is None:
+            poller = cls._shared[api] = cls()
+        return poller
+
+    def __init__(self):
+        self._snapshot = None
+        self._stamp = None
+
+        # (stamp, future) of the refresh in flight, if any
+        self._pending = None
+
+        self.refreshes = 0
+
+    def _refreshed(self, stamp, future):
+        if self._pending and self._pending[1] is future:
+            self._pending = None
+
+        if not future.cancelled() and future.exception() is None:
+            self._snapshot = future.result()
+            self._stamp = stamp
+
+    async def snapshot(self, api, since):
+        """Return (snapshot, stamp), as ListPoller.snapshot"""
+        if self._stamp is not None and self._stamp >= since:
+            return self._snapshot, self._stamp
+
+        loop = asyncio.get_running_loop()
+        if self._pending is None or self._pending[0] < since or \
+           self._pending[1].get_loop() is not loop:
+            async def refresh():
+                return _by_instanceid(await api('GET', 'amazon/instances/',
+                                                {'refresh_cache': True}))
+
+            stamp = time.time()
+            future = asyncio.ensure_future(refresh())
+            future.add_done_callback(lambda future: self._refreshed(stamp, future))
+            self._pending = (stamp, future)
+            self.refreshes += 1
+
+        stamp, future = self._pending
+
+        # one waiter giving up doesn't cancel the refresh for the others
+        return await asyncio.shield(future), stamp
+
+class AsyncServers(object):
+    def __init__(self, api):
+        self.api = api
+
+    async def wait_each(self, servers, status='running', boot_status=None, timeout=None,
+                        wait_first=Servers.WAIT_FIRST, wait=Servers.WAIT,
+                        wait_max=Servers.WAIT_MAX):
+        """Async generator counterpart of Servers.wait_each. Waiters on the
+        account share one list refresh per tick (see AsyncListPoller)"""
+        started = time.time()
+        deadline = None if timeout is None else started + timeout
+        poller = AsyncListPoller.shared(self.api)
+
+        waiting = {}
+        for server in servers:
+            if _reached(server, status, boot_status):
+                yield server
+            else:
+                waiting[server.instanceid] = server
+
+        due = started + wait_first
+        interval = wait
+        while waiting:
+            now = time.time()
+            if now >= due:
+                polled, stamp = await poller.snapshot(self.api, max(started, due - interval / 2.0))
+
+                reached, changed, error = _wait_poll(waiting, polled, status, boot_status)
+                for server in reached:
+                    yield server
+
+                if error:
+                    raise error
+
+                if not waiting:
+                    break
+
+                interval = wait if changed else min(interval * Servers.WAIT_BACKOFF, wait_max)
+                due = stamp + interval
+
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                raise _wait_timeout(waiting, status, boot_status)
+
+            wake = due if deadline is None else min(due, deadline)
+            await asyncio.sleep(max(0, wake - now))
+
+    async def wait_all(self, servers, status='running', boot_status=None, timeout=None,
+                       **kwargs):
+        """Wait until all <servers> have <status> (see wait_each).
+        Returns them as a ServerCollection, in the order they got there"""
+        return ServerCollection([ server async for server in
+                                  self.wait_each(servers, status, boot_status,
+                                                 timeout, **kwargs) ])
+
+    async def get(self, instanceid=None, refresh_cache=False, raw=False):
+        attrs = {'refresh_cache': refresh_cache}
+        if instanceid:
+            r = await self.api('GET', 'amazon/instance/%s/' % instanceid, attrs)
+        else:
+            r = await self.api('GET', 'amazon/instances/', attrs)
+
+        return ServerCollection([ AsyncServer(self.api, server, raw) for server in r ])
+
+    async def launch(self, name, region="us-east-1", size="m1.small", type="ebs",
+                     arch="amd64", label="", **kwargs):
+        """Launch a new cloud server (see Servers.launch for arguments)"""
+        attrs = {'region': region, 'size': size ,'type': type, 'arch': arch,
+                 'label': label}
+        attrs.update(kwargs)
+        r = await self.api('POST', 'amazon/launch/%s/' % name, attrs)
+
+        return AsyncServer(self.api, r)
+
+class AsyncBackups(object):
+    def __init__(self, api):
+        self.api = api
+
+    async def get(self, backup_id=None, raw=False):
+        if backup_id:
+            r = await self.api('GET', 'backup/record/%s/' % backup_id)
+            return [ BackupRecord(r, raw) ]
+        else:
+            r = await self.api('GET', 'backup/records/')
+            return [ BackupRecord(backup, raw) for backup in r ]
+
+class AsyncAppliances(object):
+    def __init__(self, api):
+        self.api = api
+
+    async def get(self, name=None, raw=False):
+        if name:
+            r = await self.api('GET', 'amazon/appliance/%s/' % name)
+        else:
+            r = await self.api('GET', 'amazon/appliances/')
+
+        return [ Appliance(appliance, raw) for appliance in r ]
+
+class AsyncHub(object):
+    """asyncio counterpart of Hub. Every API call is a coroutine, so many
+    lifecycle operations can be in flight on a single event loop"""
+
+    Error = API.Error
+    API_URL = 'https://hub.turnkeylinux.org/api/'
+
+    def __init__(self, apikey=None, timeout=None, verbose=False, limit=10):
+        headers = {}
+        if apikey:
+            headers['apikey'] = apikey
+
+        self._api = AsyncAPI(timeout=timeout, verbose=verbose, limit=limit)
+        async def api(method, uri, attrs={}):
+            return await self._api.request(method, self.API_URL + uri, attrs, headers)
+
+        self.appliances = AsyncAppliances(api)
+        self.servers = AsyncServers(api)
+        self.backups = AsyncBackups(api)
+
+    async def close(self):
+        await self._api.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -8,33 +8,63 @@
 # Free Software Foundation; either version 3 of the License, or (at your
 # option) any later version.
 # 
-from . import keypacket
-from .attrdict import AttrDict
+from .record import Record
 
 from datetime import datetime
 
-class BackupRecord(AttrDict):
+_UNSET = object()
+
+class BackupRecord(Record):
+    FIELDS = ('backup_id', 'label', 'turnkey_version', 'server_id',
+              'created', 'updated', 'size', 'address', 'skpp')
+
+    # created, updated and skpp are decoded on first access
+    __slots__ = ('backup_id', 'label', 'turnkey_version', 'server_id',
+                 'size', 'address', 'key', 'raw',
+                 '_date_created', '_date_updated',
+                 '_skpp', '_created', '_updated')
+
     def __repr__(self):
         return "<BackupRecord: %s>" % self.backup_id
 
-    def __init__(self, response):
-        self.raw = response
+    def __init__(self, response, raw=False):
+        self.raw = response if raw else None
         self.address = response['address']
         self.backup_id = response['backup_id']
         self.server_id = response['server_id']
         self.turnkey_version = response['turnkey_version']
-        self.skpp = self._key_has_passphrase(response['key'])
 
-        self.created = self._parse_datetime(response['date_created'])
-        self.updated = self._parse_datetime(response['date_updated'])
+        self.key = response['key']
+        self._date_created = response['date_created']
+        self._date_updated = response['date_updated']
+
+        self._skpp = self._created = self._updated = _UNSET
 
         self.size = int(response['size']) # in MBs
         self.label = response['description']
 
-        AttrDict.__init__(self)
+    @property
+    def skpp(self):
+        if self._skpp is _UNSET:
+            self._skpp = self._key_has_passphrase(self.key)
+        return self._skpp
+
+    @property
+    def created(self):
+        if self._created is _UNSET:
+            self._created = self._parse_datetime(self._date_created)
+        return self._created
+
+    @property
+    def updated(self):
+        if self._updated is _UNSET:
+            self._updated = self._parse_datetime(self._date_updated)
+        return self._updated
 
     @staticmethod
     def _key_has_passphrase(key):
+        # keypacket loads the crypto library, so only import it when needed
+        from . import keypacket
         try:
             keypacket.parse(key, "")
             return False
@@ -52,11 +82,50 @@ class Backups(object):
     def __init__(self, api):
         self.api = api
 
-    def get(self, backup_id=None):
+    @staticmethod
+    def _filter(server_id=None, label_prefix=None):
+        """Return a predicate over raw backup record responses, or None"""
+        if server_id is None and label_prefix is None:
+            return None
+
+        if server_id is not None:
+            if isinstance(server_id, (str, int)):
+                server_id = [server_id]
+            server_id = set([ str(id) for id in server_id ])
+
+        def match(response):
+            if server_id is not None and str(response['server_id']) not in server_id:
+                return False
+            if label_prefix is not None and \
+               not (response['description'] or '').startswith(label_prefix):
+                return False
+            return True
+
+        return match
+
+    def get(self, backup_id=None, raw=False, server_id=None, label_prefix=None):
+        """If <raw>, records keep their raw API response.
+
+        Records can be filtered by <server_id> (a value or a collection) and
+        <label_prefix>, before any BackupRecord is built"""
         if backup_id:
-            r = self.api('GET', 'backup/record/%s/' % backup_id)
-            return [ BackupRecord(r) ]
+            r = [ self.api('GET', 'backup/record/%s/' % backup_id) ]
         else:
             r = self.api('GET', 'backup/records/')
-            return [ BackupRecord(backup) for backup in r ]
 
+        match = self._filter(server_id, label_prefix)
+        if match:
+            r = filter(match, r)
+
+        return [ BackupRecord(backup, raw) for backup in r ]
+
+    def iter(self, raw=False, server_id=None, label_prefix=None):
+        """Like get(), but yield backup records as the response is decoded"""
+        r = self.api('GET', 'backup/records/', stream=True)
+
+        match = self._filter(server_id, label_prefix)
+        if match:
+            r = filter(match, r)
+
+        for backup in r:
+            yield BackupRecord(backup, raw)
@@ -0,0 +1,46 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+from concurrent import futures
+
+PARALLEL = 8
+
+def select(servers, instanceids=None, **filters):
+    """Look up servers by <instanceids> or by Servers.get filters (e.g.,
+    status, region, name) with a single request.
+
+    Returns (servers, missing_ids)"""
+    if instanceids is not None:
+        instanceids = set(instanceids)
+
+    selected = servers.get(refresh_cache=True, instanceids=instanceids, **filters)
+
+    missing_ids = instanceids - selected.instanceids() if instanceids else set()
+    return selected, missing_ids
+
+def apply(servers, action, parallel=PARALLEL):
+    """Call action(server) for each of <servers>, at most <parallel> at a time.
+
+    Yields (server, error) as each call completes. error is None if
+    the call succeeded, else the exception it raised"""
+    if not servers:
+        return
+
+    with futures.ThreadPoolExecutor(min(parallel, len(servers))) as executor:
+        fs = dict([ (executor.submit(action, server), server) for server in servers ])
+
+        for future in futures.as_completed(fs):
+            try:
+                future.result()
+                error = None
+            except Exception as e:
+                error = e
+
+            yield fs[future], error
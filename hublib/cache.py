@@ -0,0 +1,183 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import os
+import json
+import time
+import fcntl
+import hashlib
+import tempfile
+
+from os.path import join, exists
+
+def _default_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or \
+                 join(os.path.expanduser('~'), '.cache')
+    return join(cache_home, 'hubtools')
+
+class ResponseCache(object):
+    """On-disk cache of Hub API GET responses, shared between processes.
+
+    Entries are keyed by namespace (i.e., account), URI and attrs, and
+    expire after a per-endpoint TTL (longest matching URI prefix in
+    <ttls>, else <default_ttl>) unless <max_age> overrides it. A miss
+    holds an exclusive lock on the entry while it is fetched, so
+    concurrent processes wait for one request rather than all making
+    their own. Writes are atomic renames, so reads are never torn.
+
+    Entries, locks and leftover temporary files older than <prune_age>
+    are removed the first time a process uses a namespace, and by
+    invalidate().
+    """
+
+    TTLS = {
+        'amazon/appliance': 24 * 60 * 60,
+        'amazon/instance': 30,
+        'backup/record': 60,
+    }
+    DEFAULT_TTL = 0
+
+    # longer than any TTL, so pruning doesn't race with normal use
+    PRUNE_AGE = 2 * 24 * 60 * 60
+
+    # attrs that don't change what a response means, only how fresh it is
+    REFRESH_ATTRS = ('refresh_cache',)
+
+    # mutating call URI prefix -> cached URI prefixes it invalidates
+    # (mutating calls that aren't listed invalidate the whole namespace)
+    INVALIDATES = {
+        'amazon/': ('amazon/instance',),
+        'server/': ('amazon/instance',),
+    }
+
+    def __init__(self, path=None, ttls={}, default_ttl=DEFAULT_TTL, max_age=None,
+                 prune_age=PRUNE_AGE):
+        self.path = path or _default_path()
+        self.prune_age = prune_age
+        self._pruned = set()
+
+        self.ttls = dict(self.TTLS)
+        self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.max_age = max_age
+
+    def ttl(self, uri):
+        if self.max_age is not None:
+            return self.max_age
+
+        prefixes = [ prefix for prefix in self.ttls if uri.startswith(prefix) ]
+        if not prefixes:
+            return self.default_ttl
+
+        return self.ttls[max(prefixes, key=len)]
+
+    @staticmethod
+    def _slug(uri):
+        return uri.strip('/').replace('/', '_')
+
+    def _dir(self, namespace):
+        path = join(self.path, hashlib.sha1(namespace.encode()).hexdigest()[:16])
+        if not exists(path):
+            os.makedirs(path, mode=0o700, exist_ok=True)
+        return path
+
+    def _entry(self, namespace, uri, attrs):
+        attrs = sorted([ (name, str(val)) for name, val in attrs.items()
+                         if name not in self.REFRESH_ATTRS ])
+        digest = hashlib.sha1(json.dumps([uri, attrs]).encode()).hexdigest()
+
+        return join(self._dir(namespace), "%s-%s.json" % (self._slug(uri), digest[:16]))
+
+    @staticmethod
+    def _read(path, ttl):
+        try:
+            with open(path) as fh:
+                entry = json.load(fh)
+        except (IOError, ValueError):
+            return None
+
+        if time.time() - entry['time'] > ttl:
+            return None
+
+        return entry
+
+    @staticmethod
+    def _write(path, response):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as fh:
+                json.dump({'time': time.time(), 'response': response}, fh)
+            os.replace(tmp, path)
+        except:
+            os.unlink(tmp)
+            raise
+
+    def fetch(self, namespace, uri, attrs, request):
+        """Return cached response for GET <uri> <attrs>, or call request()
+        and cache its response. Refresh attrs (e.g., refresh_cache=True)
+        skip the cached entry but still store the new response"""
+        ttl = self.ttl(uri)
+        if ttl <= 0:
+            return request()
+
+        refresh = any([ attrs.get(name) for name in self.REFRESH_ATTRS ])
+
+        if namespace not in self._pruned:
+            self.prune(namespace)
+
+        path = self._entry(namespace, uri, attrs)
+        with open(path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            entry = None if refresh else self._read(path, ttl)
+            if entry:
+                return entry['response']
+
+            response = request()
+            self._write(path, response)
+
+            return response
+
+    def invalidate(self, namespace, uri=None):
+        """Drop entries made stale by a mutating call to <uri>, or all entries"""
+        prefixes = None
+        if uri:
+            for prefix, invalidates in self.INVALIDATES.items():
+                if uri.startswith(prefix):
+                    prefixes = [ self._slug(invalidate) for invalidate in invalidates ]
+                    break
+
+        path = self._dir(namespace)
+        for fname in os.listdir(path):
+            if not fname.endswith(('.json', '.json.lock')):
+                continue
+
+            if prefixes and not any([ fname.startswith(prefix) for prefix in prefixes ]):
+                continue
+
+            try:
+                os.unlink(join(path, fname))
+            except FileNotFoundError:
+                pass
+
+        self.prune(namespace)
+
+    def prune(self, namespace):
+        """Remove entries, locks and temporary files older than prune_age"""
+        self._pruned.add(namespace)
+
+        path = self._dir(namespace)
+        oldest = time.time() - self.prune_age
+        for fname in os.listdir(path):
+            try:
+                if os.stat(join(path, fname)).st_mtime < oldest:
+                    os.unlink(join(path, fname))
+            except FileNotFoundError:
+                pass
@@ -8,22 +8,194 @@
 # Free Software Foundation; either version 3 of the License, or (at your
 # option) any later version.
 #
-import string
+import re
+import csv
+import json
+
+from datetime import date
+from operator import itemgetter
 
 # custom formatting
 class Formatter:
+    """Compiled output format.
+
+    %var (or %{var}) is replaced by a record's var field and %{var:spec}
+    formats it with a format spec (e.g., %{size:>8}, %{label:<20.20},
+    %{size:,d}). %% is a literal % and \\n, \\t are a newline and tab.
+    A None field with a spec (e.g., a stopped server's ipaddress) is
+    rendered as '', padded to the spec's width.
+
+    The format is compiled once into a str.format template, so rendering
+    a record only looks up the fields the format refers to.
+    """
+
+    _FIELD = re.compile(r"""%(?:
+                             (?P<escaped>%) |
+                             (?P<named>[_a-z][_a-z0-9]*) |
+                             {(?P<braced>[_a-z][_a-z0-9]*)(?::(?P<spec>[^}]*))?} |
+                             (?P<invalid>)
+                           )""", re.IGNORECASE | re.ASCII | re.VERBOSE)
+
+    # the fill, alignment and width of a format spec
+    _WIDTH = re.compile(r"(?:(?P<align>.?[<>=^]))?[-+ ]?z?#?0?(?P<width>\d*)")
+
+    @classmethod
+    def _none_spec(cls, spec):
+        """Return the part of <spec> that applies to '' standing in for None"""
+        m = cls._WIDTH.match(spec)
+        return (m.group('align') or '').replace('=', '>') + m.group('width')
+
     def __init__(self, format):
-        tpl = format.replace('$', '$$')
-        tpl = tpl.replace('\\n', '\n')
-        tpl = tpl.replace('\\t', '\t')
-        tpl = tpl.replace('%%', '__PERCENT__')
-        tpl = tpl.replace('%', '$')
-        tpl = tpl.replace('__PERCENT__', '%')
+        format = format.replace('\\n', '\n')
+        format = format.replace('\\t', '\t')
+
+        def literal(s):
+            return s.replace('{', '{{').replace('}', '}}')
+
+        tpl = []
+        names = []
+
+        # literal strings and (name, spec) fields, for rendering None fields
+        parts = []
+
+        pos = 0
+        for m in self._FIELD.finditer(format):
+            tpl.append(literal(format[pos:m.start()]))
+            parts.append(format[pos:m.start()])
+            pos = m.end()
 
-        self.tpl = string.Template(tpl)
+            if m.group('escaped') is not None:
+                tpl.append('%')
+                parts.append('%')
+                continue
+
+            if m.group('invalid') is not None:
+                raise ValueError("invalid placeholder in format at char %d" % m.start())
+
+            spec = m.group('spec')
+            tpl.append('{%d%s}' % (len(names), ':' + spec if spec else ''))
+            names.append(m.group('named') or m.group('braced'))
+            parts.append((names[-1], spec or ''))
+
+        tpl.append(literal(format[pos:]))
+        parts.append(format[pos:])
+
+        self.names = names
+        self.tpl = ''.join(tpl)
+        self._parts = parts
+
+        if not names:
+            self._render = lambda obj: self.tpl
+        elif len(names) == 1:
+            name = names[0]
+            fmt = self.tpl.format
+            render = lambda obj: fmt(obj[name])
+        else:
+            getter = itemgetter(*names)
+            fmt = self.tpl.format
+            render = lambda obj: fmt(*getter(obj))
+
+        if names:
+            # a spec fails on a None field, which is rare enough to retry
+            def _render(obj):
+                try:
+                    return render(obj)
+                except (TypeError, ValueError):
+                    return self._render_none(obj)
+            self._render = _render
+
+    def _render_none(self, obj):
+        rendered = []
+        for part in self._parts:
+            if isinstance(part, str):
+                rendered.append(part)
+                continue
+
+            name, spec = part
+            val = obj[name]
+            if val is None and spec:
+                rendered.append(format('', self._none_spec(spec)))
+            else:
+                rendered.append(format(val, spec))
+
+        return ''.join(rendered)
 
     def __call__(self, obj):
-        return self.tpl.substitute(**obj)
+        return self._render(obj)
+
+    def render(self, objs):
+        """Render every obj in <objs>, one per line, as a single string"""
+        render = self._render
+        return ''.join([ render(obj) + '\n' for obj in objs ])
+
+# machine readable output
+OUTPUTS = ('jsonl', 'csv', 'tsv')
+
+def _json_default(val):
+    if isinstance(val, date):
+        return val.isoformat()
+    raise TypeError("can't serialize %r" % val)
+
+def _csv_value(val):
+    if val is None:
+        return ''
+    if isinstance(val, date):
+        return val.isoformat()
+    if isinstance(val, (list, dict)):
+        return json.dumps(val, default=_json_default)
+    return val
+
+class RecordWriter(object):
+    """Writes records to <fh> as JSON Lines, CSV or TSV (see OUTPUTS),
+    one row per write() so output can be streamed.
+
+    Rows have the given <fields> (CSV and TSV start with a header row).
+    If <raw>, the record's raw API response is included as a raw field.
+    Values that aren't record fields (e.g., unlocks) can be passed to
+    write() as keyword arguments.
+    """
+
+    class Error(Exception):
+        pass
+
+    def __init__(self, fh, output, fields, raw=False, flush=False):
+        if output not in OUTPUTS:
+            raise self.Error("unknown output format '%s' (choose from %s)" %
+                             (output, ", ".join(OUTPUTS)))
+
+        self.fh = fh
+        self.output = output
+        self.fields = list(fields)
+        self.raw = raw
+        self.flush = flush
+
+        self._csv = None
+        if output in ('csv', 'tsv'):
+            delimiter = ',' if output == 'csv' else '\t'
+            self._csv = csv.writer(fh, delimiter=delimiter, lineterminator='\n')
+            self._csv.writerow(self.fields + (['raw'] if raw else []))
+
+    def write(self, record, **extra):
+        values = [ extra[name] if name in extra else record[name]
+                   for name in self.fields ]
+
+        if self._csv:
+            row = [ _csv_value(val) for val in values ]
+            if self.raw:
+                row.append(_csv_value(record.raw))
+            self._csv.writerow(row)
+        else:
+            row = dict(zip(self.fields, values))
+            if self.raw:
+                row['raw'] = record.raw
+            self.fh.write(json.dumps(row, default=_json_default) + '\n')
+
+        if self.flush:
+            self.fh.flush()
+
+    def writeall(self, records):
+        for record in records:
+            self.write(record)
 
 # helper formatting
 def _fmt_bool(bool):
@@ -43,13 +215,20 @@ def _fmt_status(status, boot_status):
     return status
 
 # backup formatters
-def fmt_backup_header():
+def fmt_backup_header(unlocks=False):
+    if unlocks:
+        return "# ID  SKPP  Unlocks  Created     Updated     Size (MB)  Label"
     return "# ID  SKPP  Created     Updated     Size (MB)  Label"
 
-def fmt_backup(backup):
+def fmt_backup(backup, unlocks=None):
+    """<unlocks> (if not None) adds a column for whether a passphrase unlocks the backup key"""
+    skpp = _fmt_bool(backup.skpp)
+    if unlocks is not None:
+        skpp = "%-3s   %-6s" % (skpp, _fmt_bool(unlocks))
+
     return "%4s  %-3s   %s  %-10s  %-8s   %s" % \
         (backup.backup_id,
-         _fmt_bool(backup.skpp),
+         skpp,
          backup.created.strftime("%Y-%m-%d"),
          backup.updated.strftime("%Y-%m-%d") if backup.updated else "-",
          _fmt_size(backup.size),
@@ -67,6 +246,38 @@ def fmt_server(server):
          server.region,
          server.label)
 
+# stats formatters
+def _fmt_ms(seconds):
+    return "-" if seconds is None else "%d" % round(seconds * 1000)
+
+def fmt_stats(stats):
+    """Format Hub.stats() as a summary table"""
+    lines = ["# Endpoint                                Reqs  p50ms  p95ms  p99ms"
+             "  Bytes in  Bytes out  Errors"]
+
+    endpoints = stats['endpoints']
+    for name in sorted(endpoints, key=lambda name: -endpoints[name]['requests']):
+        endpoint = endpoints[name]
+        errors = ", ".join([ "%s=%d" % error for error in sorted(endpoint['errors'].items()) ])
+        lines.append("  %-38s  %4d  %5s  %5s  %5s  %8d  %9d  %s" %
+                     (name, endpoint['requests'],
+                      _fmt_ms(endpoint['p50']), _fmt_ms(endpoint['p95']), _fmt_ms(endpoint['p99']),
+                      endpoint['bytes_in'], endpoint['bytes_out'], errors or "-"))
+
+    connections = stats['connections']
+    summary = "# %d requests, %d new connections, %d reused" % \
+              (connections['requests'], connections['connects'], connections['reused'])
+
+    if stats.get('coalesced'):
+        summary += ", %d coalesced" % stats['coalesced']
+
+    if 'ratelimit' in stats:
+        waited = sum([ bucket['waited'] for bucket in stats['ratelimit'].values() ])
+        summary += ", %.2fs waiting on rate limiter" % waited
+
+    lines.append(summary)
+    return "\n".join(lines)
+
 # appliance formatters
 def fmt_appliance_header():
     return "# Name               Ver.  Preseeds"
@@ -10,8 +10,15 @@
 #
 import os
 import hashlib
+import hmac
 import base64
 import struct
+import threading
+
+from concurrent import futures
+
+from collections import OrderedDict
+from itertools import repeat
 
 from Cryptodome.Cipher import AES
 
@@ -23,6 +30,8 @@ KILO_REPEATS_CIPHER = 80
 
 FINGERPRINT_LEN = 6
 
+KEY_CACHE_SIZE = 16
+
 class Error(Exception):
     pass
 
@@ -35,19 +44,106 @@ def _unpad(padded):
     len, = struct.unpack("!H", padded[-2:])
     return padded[-(2 + len) :-2]
 
-def _repeat(f, input, count):
-    for x in range(count):
-        input = f(input)
-    return input
+def _hash_chain(k, count):
+    sha256 = hashlib.sha256
+    for i in repeat(None, count):
+        k = sha256(k).digest()
+    return k
+
+class _KeyCache(object):
+    """Bounded LRU cache of derived cipher keys.
+
+    Entries are looked up by a keyed hash of the passphrase (so the cache
+    doesn't hold on to passphrases) and stored in bytearrays that are
+    zeroed when evicted or cleared.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._salt = os.urandom(16)
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _id(self, passphrase, repeats):
+        mac = hmac.new(self._salt, passphrase, hashlib.sha256).digest()
+        return (mac, repeats)
+
+    def get(self, passphrase, repeats):
+        id = self._id(passphrase, repeats)
+        with self._lock:
+            key = self._keys.get(id)
+            if key is None:
+                return None
+
+            self._keys.move_to_end(id)
+            return bytes(key)
+
+    def set(self, passphrase, repeats, key):
+        id = self._id(passphrase, repeats)
+        with self._lock:
+            if id in self._keys:
+                return
+
+            self._keys[id] = bytearray(key)
+            while len(self._keys) > self.size:
+                self._wipe(self._keys.popitem(last=False)[1])
+
+    @staticmethod
+    def _wipe(key):
+        key[:] = bytes(len(key))
+
+    def clear(self):
+        with self._lock:
+            for key in self._keys.values():
+                self._wipe(key)
+            self._keys.clear()
+
+_key_cache = _KeyCache(KEY_CACHE_SIZE)
 
 def _cipher_key(passphrase, repeats):
-    cipher_key = _repeat(lambda k: hashlib.sha256(k.encode()).digest(),
-                         passphrase, repeats)
+    passphrase = passphrase.encode() if isinstance(passphrase, str) else passphrase
+
+    cipher_key = _key_cache.get(passphrase, repeats)
+    if cipher_key is None:
+        cipher_key = _hash_chain(passphrase, repeats)
+        _key_cache.set(passphrase, repeats, cipher_key)
+
     return cipher_key
 
 def _cipher(cipher_key):
     return AES.new(cipher_key, mode=AES.MODE_CBC, IV=b'\0' * 16)
 
+def _xor16(a, b):
+    return (int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')).to_bytes(16, 'big')
+
+# Each cipher round is a CBC pass with a zero IV. Rather than creating a
+# new cipher for every round, one is reused: carrying on from the previous
+# round leaves its IV set to the last ciphertext block, which is cancelled
+# by XORing it into the first block (of the input when encrypting, of the
+# output when decrypting).
+
+def _encrypt_rounds(cipher_key, v, count):
+    if not count:
+        return v
+
+    encrypt = _cipher(cipher_key).encrypt
+    v = encrypt(v)
+    for i in repeat(None, count - 1):
+        v = encrypt(_xor16(v[:16], v[-16:]) + v[16:])
+    return v
+
+def _decrypt_rounds(cipher_key, v, count):
+    if not count:
+        return v
+
+    decrypt = _cipher(cipher_key).decrypt
+    prev = v
+    v = decrypt(v)
+    for i in repeat(None, count - 1):
+        out = decrypt(v)
+        prev, v = v, _xor16(out[:16], prev[-16:]) + out[16:]
+    return v
+
 def fmt(secret, passphrase):
     salt = os.urandom(SALT_LEN)
 
@@ -60,13 +156,12 @@ def fmt(secret, passphrase):
     cipher_key = _cipher_key(passphrase, hash_repeats)
     plaintext = salt + hashlib.sha1(secret).digest() + secret
 
-    ciphertext = _repeat(lambda v: _cipher(cipher_key).encrypt(v),
-                         _pad(plaintext), cipher_repeats)
+    ciphertext = _encrypt_rounds(cipher_key, _pad(plaintext), cipher_repeats)
 
     fingerprint = hashlib.sha1(secret).digest()[:FINGERPRINT_LEN]
     packet = struct.pack("!BHH", KEY_VERSION,
-                         hash_repeats / 1000,
-                         cipher_repeats / 1000) + fingerprint + ciphertext
+                         hash_repeats // 1000,
+                         cipher_repeats // 1000) + fingerprint + ciphertext
 
     return base64.b64encode(packet)
 
@@ -74,7 +169,7 @@ def _parse(packet):
     try:
         packet = base64.b64decode(packet)
         version, khr, kcr = struct.unpack("!BHH", packet[:5])
-    except (TypeError, struct.error) as e:
+    except (TypeError, ValueError, struct.error) as e:
         raise Error("can't parse key packet: " + str(e))
 
     minimum_len = (5 + FINGERPRINT_LEN + 16)
@@ -98,12 +193,11 @@ def parse(packet, passphrase):
         hash_repeats = khr * 1000 + 1
         cipher_repeats = kcr * 1000 + 1
 
-    cipher_key = _cipher_key(passphrase, hash_repeats)
-    decrypted = _repeat(lambda v: _cipher(cipher_key).decrypt(v),
-                        ciphertext,
-                        cipher_repeats)
+    if len(ciphertext) % 16:
+        raise Error("key packet ciphertext isn't a multiple of the block size")
 
-    decrypted = _unpad(decrypted)
+    cipher_key = _cipher_key(passphrase, hash_repeats)
+    decrypted = _unpad(_decrypt_rounds(cipher_key, ciphertext, cipher_repeats))
 
     digest = decrypted[SALT_LEN:SALT_LEN+20]
     secret = decrypted[SALT_LEN+20:]
@@ -115,3 +209,37 @@ def parse(packet, passphrase):
 
 def fingerprint(packet):
     return base64.b16encode(_parse(packet)[2])
+
+def _unlocks(packet, passphrase):
+    try:
+        parse(packet, passphrase)
+        return True
+    except Error:
+        return False
+
+def _available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def verify_many(packets, passphrase, processes=None):
+    """Check which of <packets> can be unlocked with <passphrase>.
+
+    The checks are spread across a pool of worker processes (by default
+    one per available CPU). Yields (index, unlocks) tuples in the order
+    the checks complete.
+    """
+    packets = list(packets)
+    processes = min(processes or _available_cpus(), len(packets))
+
+    if processes <= 1:
+        for i, packet in enumerate(packets):
+            yield i, _unlocks(packet, passphrase)
+        return
+
+    with futures.ProcessPoolExecutor(processes) as executor:
+        fs = dict([ (executor.submit(_unlocks, packet, passphrase), i)
+                    for i, packet in enumerate(packets) ])
+
+        for future in futures.as_completed(fs):
+            yield fs[future], future.result()
@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import time
+
+from .attrdict import AttrDict
+
+_monotonic = time.monotonic
+
+class LifecycleEvent(AttrDict):
+    """A step in an instance's life, as reported to a Spawner's event hook.
+
+    time is a time.monotonic() timestamp. request numbers a launch request
+    so that LAUNCH_REQUESTED can be matched with its LAUNCHED (or
+    FAILED) event. polls is the number of status polls an instance spent
+    in its previous state (TRANSITION), or in total (BOOTED).
+    """
+
+    LAUNCH_REQUESTED = 'launch_requested'
+    LAUNCHED = 'launched'
+    TRANSITION = 'transition'
+    BOOTED = 'booted'
+    DESTROYED = 'destroyed'
+    FAILED = 'failed'
+
+    def __repr__(self):
+        return "<LifecycleEvent: %s %s>" % (self.type, self.instanceid or self.request)
+
+    def __init__(self, type, server=None, time=None, request=None, instanceid=None,
+                 name=None, region=None, size=None, polls=None, error=None):
+        self.type = type
+        self.time = time if time is not None else _monotonic()
+        self.request = request
+
+        self.instanceid = server.instanceid if server else instanceid
+        self.name = server.name if server else name
+        self.region = server.region if server else region
+        self.size = server.size if server else size
+        self.status = server.status if server else None
+        self.boot_status = server.boot_status if server else None
+
+        self.polls = polls
+        self.error = error
+
+        AttrDict.__init__(self)
+
+def _distribution(vals):
+    vals = sorted(vals)
+    if not vals:
+        return None
+
+    def percentile(p):
+        return vals[min(len(vals) - 1, int(p / 100.0 * len(vals)))]
+
+    return {'count': len(vals), 'mean': sum(vals) / len(vals),
+            'p50': percentile(50), 'p95': percentile(95), 'max': vals[-1]}
+
+class BootLatency(object):
+    """Spawner event hook that measures, for every instance that boots:
+
+        launch      launch requested -> launch acknowledged by the Hub
+        running     launch requested -> first seen running
+        booted      launch requested -> booted
+        polls       status polls from launch to booted
+
+    and summarizes their distributions per (appliance, region, size).
+    """
+
+    def __init__(self):
+        self._requested = {}
+        self._instances = {}
+        self._samples = {}
+        self.failed = 0
+
+    def __call__(self, event):
+        if event.type == event.LAUNCH_REQUESTED:
+            self._requested[event.request] = event.time
+
+        elif event.type == event.LAUNCHED:
+            requested = self._requested.pop(event.request, event.time)
+            self._instances[event.instanceid] = {'requested': requested,
+                                                 'launched': event.time,
+                                                 'running': None}
+
+        elif event.type == event.TRANSITION:
+            instance = self._instances.get(event.instanceid)
+            if instance and instance['running'] is None and event.status == 'running':
+                instance['running'] = event.time
+
+        elif event.type == event.BOOTED:
+            instance = self._instances.pop(event.instanceid, None)
+            if instance is None:
+                return
+
+            requested = instance['requested']
+            running = instance['running'] or event.time
+
+            samples = self._samples.setdefault((event.name, event.region, event.size),
+                                               {'launch': [], 'running': [],
+                                                'booted': [], 'polls': []})
+            samples['launch'].append(instance['launched'] - requested)
+            samples['running'].append(running - requested)
+            samples['booted'].append(event.time - requested)
+            samples['polls'].append(event.polls or 0)
+
+        elif event.type == event.FAILED:
+            self.failed += 1
+            self._requested.pop(event.request, None)
+            self._instances.pop(event.instanceid, None)
+
+    def summary(self):
+        """Return {(appliance, region, size): {launch, running, booted, polls}},
+        each a dict of count, mean, p50, p95 and max (seconds, or polls)"""
+        return dict([ (key, dict([ (measure, _distribution(vals))
+                                   for measure, vals in samples.items() ]))
+                      for key, samples in self._samples.items() ])
+
+    def report(self):
+        """Return summary() as a table"""
+        lines = ["# %-16s %-14s %-11s %5s %15s %15s %15s %6s" %
+                 ("Appliance", "Region", "Size", "Boots", "Launch p50/p95",
+                  "Running p50/p95", "Booted p50/p95", "Polls")]
+
+        for (name, region, size), summary in sorted(self.summary().items()):
+            columns = [ "%.1f/%.1f" % (summary[measure]['p50'], summary[measure]['p95'])
+                        for measure in ('launch', 'running', 'booted') ]
+
+            lines.append("  %-16s %-14s %-11s %5d %15s %15s %15s %6.1f" %
+                         tuple([name, region, size, summary['booted']['count']] + columns +
+                               [summary['polls']['mean']]))
+
+        if self.failed:
+            lines.append("# %d failed" % self.failed)
+
+        return "\n".join(lines)
@@ -0,0 +1,132 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import bisect
+import threading
+
+import pycurl
+
+from py3curl_wrapper import API
+
+# URI segments following these are parameters (e.g., an instance ID)
+_PARAMETRIZED = ('instance', 'record', 'appliance', 'launch', 'status')
+
+def endpoint(method, uri):
+    """Return the endpoint <uri> belongs to, e.g.,
+    PUT amazon/instance/i-1234/stop/ -> PUT amazon/instance/<id>/stop/"""
+    segments = uri.split('/')
+    for i in range(1, len(segments)):
+        if segments[i - 1] in _PARAMETRIZED and segments[i]:
+            segments[i] = '<id>'
+
+    return "%s %s" % (method, '/'.join(segments))
+
+def error_name(e):
+    if isinstance(e, API.Error):
+        return e.name
+
+    if isinstance(e, pycurl.error):
+        return "curl.%d" % e.args[0]
+
+    return e.__class__.__name__
+
+class Histogram(object):
+    """Latency histogram with logarithmic buckets, about 19% wide each,
+    from 1ms to 2 minutes"""
+
+    BOUNDS = [ 0.001 * 2 ** (i / 4.0) for i in range(68) ]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, p):
+        """Return upper bound of the bucket holding the <p>th percentile"""
+        if not self.count:
+            return None
+
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.BOUNDS[i], self.max) if i < len(self.BOUNDS) else self.max
+
+        return self.max
+
+class Metrics(object):
+    """Per-endpoint request metrics: count, latency percentiles, bytes in
+    and out, and errors by name.
+
+    If a <sink> is given, sink(event) is also called after every request
+    with a dict of method, uri, endpoint, seconds, bytes_in, bytes_out and
+    error (the error name, or None), e.g., to feed statsd or a log.
+    """
+
+    PERCENTILES = (50, 95, 99)
+
+    def __init__(self, sink=None):
+        self.sink = sink
+
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, method, uri, seconds, bytes_in=0, bytes_out=0, error=None):
+        name = endpoint(method, uri)
+        if error is not None:
+            error = error_name(error)
+
+        with self._lock:
+            stats = self._endpoints.get(name)
+            if stats is None:
+                stats = self._endpoints[name] = {
+                    'requests': 0, 'bytes_in': 0, 'bytes_out': 0,
+                    'errors': {}, 'latency': Histogram()
+                }
+
+            stats['requests'] += 1
+            stats['bytes_in'] += bytes_in
+            stats['bytes_out'] += bytes_out
+            stats['latency'].add(seconds)
+            if error is not None:
+                stats['errors'][error] = stats['errors'].get(error, 0) + 1
+
+        if self.sink:
+            self.sink({'method': method, 'uri': uri, 'endpoint': name,
+                       'seconds': seconds, 'bytes_in': bytes_in,
+                       'bytes_out': bytes_out, 'error': error})
+
+    def stats(self):
+        """Return {endpoint: {requests, bytes_in, bytes_out, errors, mean,
+        max, p50, p95, p99}}, with latencies in seconds"""
+        with self._lock:
+            result = {}
+            for name, stats in self._endpoints.items():
+                latency = stats['latency']
+
+                summary = dict([ (key, stats[key]) for key in
+                                 ('requests', 'bytes_in', 'bytes_out') ])
+                summary['errors'] = dict(stats['errors'])
+                summary['mean'] = latency.total / latency.count
+                summary['max'] = latency.max
+                for p in self.PERCENTILES:
+                    summary['p%d' % p] = latency.percentile(p)
+
+                result[name] = summary
+
+            return result
@@ -0,0 +1,191 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import time
+import weakref
+import threading
+
+from py3curl_wrapper import API
+
+from .servers import ServerCollection
+
+def _call(callable, *args, **kwargs):
+    return callable(*args, **kwargs)
+
+class StatusPoller(object):
+    """Schedules status refreshes for a set of instances.
+
+    Each instance is polled <wait_first> seconds after it is added, then
+    every <wait> seconds, backing off towards <wait_max> for as long as
+    its (status, boot_status) doesn't change. Instances that are due are
+    refreshed individually (amazon/instance/<id>/) while there are only a
+    few of them, otherwise with a single full list refresh, which also
+    refreshes every other scheduled instance for free.
+    """
+
+    LIST_THRESHOLD = 5
+    BACKOFF = 1.5
+
+    def __init__(self, servers, wait_first, wait, wait_max, retry=_call,
+                 list_threshold=LIST_THRESHOLD):
+        self.servers = servers
+        self.retry = retry
+
+        self.wait_first = wait_first
+        self.wait = wait
+        self.wait_max = wait_max
+        self.list_threshold = list_threshold
+
+        # instanceid -> [due, interval, (status, boot_status)]
+        self.schedule = {}
+
+        # size of the last full list, if any
+        self.account_size = None
+
+    def __len__(self):
+        return len(self.schedule)
+
+    def __contains__(self, instanceid):
+        return instanceid in self.schedule
+
+    def add(self, instanceid):
+        self.schedule[instanceid] = [time.time() + self.wait_first, self.wait, None]
+
+    def remove(self, instanceid):
+        self.schedule.pop(instanceid, None)
+
+    def next_due(self):
+        """Return time the next instance is due to be polled, or None"""
+        if not self.schedule:
+            return None
+
+        return min(entry[0] for entry in self.schedule.values())
+
+    def due(self, now=None):
+        if now is None:
+            now = time.time()
+
+        return [ instanceid
+                 for instanceid, entry in self.schedule.items()
+                 if entry[0] <= now ]
+
+    def _use_list(self, count):
+        if count > self.list_threshold:
+            return True
+
+        # on a small account the full list is about as cheap as one instance
+        return self.account_size is not None and self.account_size <= count
+
+    def _get_instance(self, instanceid):
+        try:
+            return self.servers.get(instanceid, refresh_cache=True)
+        except API.Error as e:
+            if e.code == 404:
+                return []
+            raise
+
+    def fetch(self, instanceids):
+        """Refresh <instanceids> now. Returns (servers, missing_ids)"""
+        instanceids = set(instanceids)
+        if not instanceids:
+            return ServerCollection(), set()
+
+        if self._use_list(len(instanceids)):
+            servers = self.retry(self.servers.get, refresh_cache=True)
+            self.account_size = len(servers)
+            servers = ServerCollection([ server for server in servers
+                                         if server.instanceid in instanceids ])
+        else:
+            servers = ServerCollection()
+            for instanceid in instanceids:
+                servers.extend(self.retry(self._get_instance, instanceid))
+
+        missing_ids = instanceids - servers.instanceids()
+        return servers, missing_ids
+
+    def poll(self):
+        """Refresh the instances that are due. Returns (servers, missing_ids)"""
+        now = time.time()
+        instanceids = self.due(now)
+        if not instanceids:
+            return ServerCollection(), set()
+
+        if self._use_list(len(instanceids)):
+            instanceids = list(self.schedule)
+
+        servers, missing_ids = self.fetch(instanceids)
+        for server in servers:
+            self._reschedule(server, now)
+
+        return servers, missing_ids
+
+    def _reschedule(self, server, now):
+        entry = self.schedule.get(server.instanceid)
+        if entry is None:
+            return
+
+        due, interval, state = entry
+        if (server.status, server.boot_status) != state:
+            interval = self.wait
+        else:
+            interval = min(interval * self.BACKOFF, self.wait_max)
+
+        entry[:] = [ now + interval, interval, (server.status, server.boot_status) ]
+
+def _by_instanceid(response):
+    return dict([ (server['instanceid'], server) for server in response ])
+
+class ListPoller(object):
+    """Shares full server list refreshes between everyone waiting on the
+    servers of one account (see Servers.wait_each), so any number of
+    waiters, in any number of threads, cost one amazon/instances/ request
+    per tick rather than one per server or per waiter.
+
+    A waiter asks for a snapshot whose refresh started no earlier than
+    <since>. The first waiter to ask refreshes the list, and every other
+    waiter whose <since> is covered by that refresh shares it.
+
+    Pollers are kept per api for as long as it lives. Snapshots are raw
+    API responses, which don't refer back to the api, so they don't keep
+    it (or its Hub) alive.
+    """
+
+    _shared = weakref.WeakKeyDictionary()
+    _shared_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, api):
+        """Return the poller shared by every user of <api>"""
+        with cls._shared_lock:
+            poller = cls._shared.get(api)
+            if poller is None:
+                poller = cls._shared[api] = cls()
+            return poller
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._stamp = None
+
+        self.refreshes = 0
+
+    def snapshot(self, api, since):
+        """Return (snapshot, stamp): the raw response of every server by
+        instanceid, refreshed with <api> starting at time <stamp>, which
+        is >= <since>"""
+        with self._lock:
+            if self._stamp is None or self._stamp < since:
+                stamp = time.time()
+                self._snapshot = _by_instanceid(api('GET', 'amazon/instances/',
+                                                    {'refresh_cache': True}))
+                self._stamp = stamp
+                self.refreshes += 1
+
+            return self._snapshot, self._stamp
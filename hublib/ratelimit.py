@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import os
+import json
+import time
+import fcntl
+import threading
+
+class RateLimiter(object):
+    """Token bucket rate limiter for Hub API requests.
+
+    Reads (GET, HEAD) and mutations (everything else) have separate
+    buckets, each refilled at <rate> requests per second up to <burst>.
+    A request that finds its bucket empty reserves the next token and
+    sleeps until it is due, so waiters are served in order.
+
+    Every thread using a limiter shares its buckets. If a <path> is given,
+    bucket state is kept in that file under an exclusive lock, so every
+    process using the same path (e.g., one per API key) shares the limits.
+    """
+
+    READ_METHODS = ('GET', 'HEAD')
+
+    READ_RATE = 5
+    READ_BURST = 10
+    MUTATION_RATE = 1
+    MUTATION_BURST = 3
+
+    def __init__(self, read_rate=READ_RATE, read_burst=READ_BURST,
+                 mutation_rate=MUTATION_RATE, mutation_burst=MUTATION_BURST,
+                 path=None):
+        self.limits = {'reads': (float(read_rate), float(read_burst)),
+                       'mutations': (float(mutation_rate), float(mutation_burst))}
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._state = {}
+
+        self._stats = dict([ (bucket, {'requests': 0, 'waits': 0,
+                                       'waited': 0.0, 'max_wait': 0.0})
+                             for bucket in self.limits ])
+
+    def bucket(self, method):
+        return 'reads' if method in self.READ_METHODS else 'mutations'
+
+    def _reserve(self, state, bucket, now):
+        """Take a token from <bucket> in <state>. Return seconds until it's due"""
+        rate, burst = self.limits[bucket]
+        tokens, stamp = state.get(bucket, (burst, now))
+
+        tokens = min(burst, tokens + max(0, now - stamp) * rate) - 1
+        state[bucket] = [tokens, now]
+
+        return -tokens / rate if tokens < 0 else 0
+
+    def _reserve_shared(self, bucket, now):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        with os.fdopen(fd, 'r+') as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+
+            try:
+                state = json.loads(fh.read() or '{}')
+            except ValueError:
+                state = {}
+
+            delay = self._reserve(state, bucket, now)
+
+            fh.seek(0)
+            fh.truncate()
+            fh.write(json.dumps(state))
+
+        return delay
+
+    def acquire(self, method):
+        """Block until a request with <method> may be sent. Returns seconds waited"""
+        bucket = self.bucket(method)
+
+        with self._lock:
+            now = time.time()
+            if self.path:
+                delay = self._reserve_shared(bucket, now)
+            else:
+                delay = self._reserve(self._state, bucket, now)
+
+            stats = self._stats[bucket]
+            stats['requests'] += 1
+            if delay:
+                stats['waits'] += 1
+                stats['waited'] += delay
+                stats['max_wait'] = max(stats['max_wait'], delay)
+
+        if delay:
+            time.sleep(delay)
+
+        return delay
+
+    def stats(self):
+        """Return {bucket: {requests, waits, waited, max_wait}}, where waited
+        and max_wait are seconds spent waiting for the limiter"""
+        with self._lock:
+            return dict([ (bucket, dict(stats)) for bucket, stats in self._stats.items() ])
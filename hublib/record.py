@@ -0,0 +1,57 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+class Record(object):
+    """Compact base class for API records.
+
+    Subclasses list their data fields in FIELDS and store them (plus any
+    bookkeeping such as raw) in __slots__, so a record costs no more than
+    its attribute values. Records support attribute access and a read-only
+    mapping protocol over FIELDS, so Formatter and **record work as they
+    did with the old dict based records.
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def values(self):
+        return [ getattr(self, name) for name in self.FIELDS ]
+
+    def items(self):
+        return [ (name, getattr(self, name)) for name in self.FIELDS ]
+
+    def get(self, name, default=None):
+        if name not in self.FIELDS:
+            return default
+        return getattr(self, name)
+
+    def __getitem__(self, name):
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __contains__(self, name):
+        return name in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+    def __eq__(self, other):
+        if not isinstance(other, Record) or self.FIELDS != other.FIELDS:
+            return NotImplemented
+        return self.values() == other.values()
+
+    __hash__ = None
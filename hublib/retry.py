@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import time
+import random
+
+import pycurl
+
+from py3curl_wrapper import API
+
+class RetryPolicy(object):
+    """Retry Hub API calls with exponential backoff and jitter.
+
+    The n-th retry sleeps backoff * 2**n seconds (capped at backoff_max),
+    less a random fraction of up to <jitter> of that so that many clients
+    don't retry in lockstep. No retry is attempted once <retries> is
+    exhausted or if it would overrun the <deadline> (seconds since the
+    first attempt).
+
+    Hub errors named in <fatal> are never retried. Calls are idempotent by
+    default and retry every other Hub error and transport error.
+    Non-idempotent calls (e.g., launch) only retry Hub errors named in
+    <retryable> and transport errors that happen before the request could
+    have reached the Hub.
+    """
+
+    FATAL = frozenset(['HubAccount.InvalidApiKey',
+                       'BackupRecord.NotFound',
+                       'Request.MissingArgument'])
+    RETRYABLE = frozenset()
+
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+    # curl errors raised before a request is sent (proxy/host resolution,
+    # connect, TLS handshake) are safe to retry even if not idempotent
+    CONNECT_ERRORS = (pycurl.E_COULDNT_RESOLVE_PROXY,
+                      pycurl.E_COULDNT_RESOLVE_HOST,
+                      pycurl.E_COULDNT_CONNECT,
+                      pycurl.E_SSL_CONNECT_ERROR)
+
+    RETRIES = 3
+    BACKOFF = 1
+    BACKOFF_MAX = 30
+    JITTER = 0.5
+
+    def __init__(self, retries=RETRIES, backoff=BACKOFF, backoff_max=BACKOFF_MAX,
+                 jitter=JITTER, deadline=None, fatal=(), retryable=()):
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.deadline = deadline
+
+        self.fatal = set(self.FATAL) | set(fatal)
+        self.retryable = set(self.RETRYABLE) | set(retryable)
+
+    def idempotent(self, method):
+        return method in self.IDEMPOTENT_METHODS
+
+    def should_retry(self, e, idempotent=True):
+        if isinstance(e, API.Error):
+            if e.name in self.fatal:
+                return False
+
+            if e.name in self.retryable:
+                return True
+
+            return idempotent
+
+        if isinstance(e, pycurl.error):
+            return idempotent or e.args[0] in self.CONNECT_ERRORS
+
+        return False
+
+    def delay(self, attempt):
+        """Return seconds to sleep before retry number <attempt> (from 0)"""
+        delay = min(self.backoff * (2 ** attempt), self.backoff_max)
+        return delay * (1 - self.jitter * random.random())
+
+    def call(self, callable, args=(), kwargs={}, idempotent=True):
+        """Call callable(*args, **kwargs), retrying according to this policy.
+        Raises the last error if retries are exhausted"""
+        started = time.time()
+        attempt = 0
+        while True:
+            try:
+                return callable(*args, **kwargs)
+            except (API.Error, pycurl.error) as e:
+                if attempt >= self.retries or not self.should_retry(e, idempotent):
+                    raise
+
+                delay = self.delay(attempt)
+                if self.deadline is not None and \
+                   time.time() - started + delay > self.deadline:
+                    raise
+
+            time.sleep(delay)
+            attempt += 1
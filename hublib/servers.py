@@ -8,28 +8,141 @@
 # Free Software Foundation; either version 3 of the License, or (at your
 # option) any later version.
 #
-from .attrdict import AttrDict
+import sys
+import time
+
+from py3curl_wrapper import API
+
+from .record import Record
+
+def _intern(s):
+    return sys.intern(s) if s else s
+
+def _selected(values):
+    """Return filter values (a single value or a collection) as a set"""
+    if values is None:
+        return None
+
+    if isinstance(values, str):
+        return set([values])
+
+    return set(values)
+
+def _server_filter(status=None, region=None, name=None, instanceids=None,
+                   addresses=None, label_prefix=None):
+    """Return a predicate over raw instance responses, or None if all match"""
+    status = _selected(status)
+    region = _selected(region)
+    name = _selected(name)
+    instanceids = _selected(instanceids)
+    addresses = _selected(addresses)
+
+    if status is None and region is None and name is None and \
+       instanceids is None and addresses is None and label_prefix is None:
+        return None
+
+    def match(response):
+        if status is not None and response['status'] not in status:
+            return False
+        if region is not None and response['region'] not in region:
+            return False
+        if name is not None and response['server']['name'] not in name:
+            return False
+        if instanceids is not None and response['instanceid'] not in instanceids:
+            return False
+        if addresses is not None and response['instanceid'] not in addresses and \
+           response['ipaddress'] not in addresses:
+            return False
+        if label_prefix is not None and \
+           not (response['server']['description'] or '').startswith(label_prefix):
+            return False
+        return True
+
+    return match
+
+def _reached(server, status, boot_status):
+    return server.status == status and \
+           (boot_status is None or server.boot_status == boot_status)
+
+def _wait_poll(waiting, polled, status, boot_status):
+    """Update <waiting> servers (by instanceid) from <polled> raw responses
+    (by instanceid), removing those that reached <status>.
+
+    Returns (reached, changed, error): the servers that got there, whether
+    any server changed and, if one was terminated or disappeared, the
+    Servers.Error to raise once the others have been yielded"""
+    reached = []
+    changed = False
+    error = None
+    for instanceid, server in list(waiting.items()):
+        response = polled.get(instanceid)
+        if response is None:
+            del waiting[instanceid]
+            if status != 'terminated':
+                error = Servers.Error("instance %s no longer exists" % instanceid)
+                continue
+
+            server.status = 'terminated'
+            reached.append(server)
+            continue
+
+        state = (server.status, server.boot_status)
+        server._parse_response(response)
+        if (server.status, server.boot_status) != state:
+            changed = True
+
+        if _reached(server, status, boot_status):
+            del waiting[instanceid]
+            reached.append(server)
+
+        elif server.status == 'terminated':
+            error = Servers.Error("instance %s was terminated" % instanceid)
+
+    return reached, changed, error
+
+def _wait_timeout(waiting, status, boot_status):
+    return Servers.Timeout("timed out waiting for %d instances (%s) to be %s" %
+                           (len(waiting), " ".join(sorted(waiting)),
+                            status if boot_status is None
+                            else "%s/%s" % (status, boot_status)))
+
+class Server(Record):
+    FIELDS = ('instanceid', 'size', 'type', 'region', 'label', 'name',
+              'ipaddress', 'status', 'boot_status')
+    __slots__ = FIELDS + ('serverid', 'api', 'raw')
 
-class Server(AttrDict):
     def __repr__(self):
         return "<Server: %s (%s, %s)>" % (self.name, self.instanceid, self.status)
 
-    def __init__(self, api, response):
+    def __init__(self, api, response, raw=False):
         self.api = api
+        self.raw = response if raw else None
         self._parse_response(response)
-        AttrDict.__init__(self)
 
     def _parse_response(self, response):
-        self.raw = response
+        if self.raw is not None:
+            self.raw = response
+
+        # low cardinality values are shared between records
         self.instanceid = response['instanceid']
-        self.size = response['type']
-        self.region = response['region']
+        self.size = _intern(response['type'])
+        self.region = _intern(response['region'])
         self.ipaddress = response['ipaddress']
-        self.status = response['status']
-        self.boot_status = response['server']['boot_status']
-        self.name = response['server']['name']
+        self.status = _intern(response['status'])
+        self.boot_status = _intern(response['server']['boot_status'])
+        self.name = _intern(response['server']['name'])
         self.label = response['server']['description']
         self.type = 'ebs' if response['ebs_backed'] else 's3'
+        self.serverid = response['server'].get('serverid')
+
+    def wait_for(self, status='running', boot_status=None, timeout=None, **kwargs):
+        """Wait until this server has <status> (and <boot_status>, if given).
+        See Servers.wait_each for arguments and errors"""
+        for server in Servers(self.api).wait_each([self], status, boot_status,
+                                                   timeout, **kwargs):
+            pass
+
+        return self
 
     def update(self):
         attrs = {'refresh_cache': True}
@@ -59,23 +172,313 @@ class Server(AttrDict):
         self.api('DELETE', 'amazon/instance/%s/unregister/' % self.instanceid)
 
     def set_boot_status(self, boot_status):
-        attrs = {'serverid': self.raw['server']['serverid']}
+        attrs = {'serverid': self.serverid}
         self.api('PUT', 'server/status/%s/' % boot_status, attrs)
 
         self.boot_status = boot_status
 
+class ServerCollection(list):
+    """A list of servers, indexed by instanceid and ipaddress.
+
+    Indexes and groupings are built on first use and dropped whenever
+    the list is modified. The set operators (-, &, |) match servers
+    by instanceid, so two snapshots can be diffed cheaply.
+    """
+
+    def __init__(self, servers=()):
+        list.__init__(self, servers)
+        self._invalidate()
+
+    def _invalidate(self):
+        self._by_instanceid = None
+        self._by_ipaddress = None
+        self._groups = {}
+
+    @property
+    def by_instanceid(self):
+        if self._by_instanceid is None:
+            self._by_instanceid = dict([ (server.instanceid, server) for server in self ])
+        return self._by_instanceid
+
+    @property
+    def by_ipaddress(self):
+        if self._by_ipaddress is None:
+            self._by_ipaddress = dict([ (server.ipaddress, server)
+                                        for server in self if server.ipaddress ])
+        return self._by_ipaddress
+
+    def find(self, address):
+        """Return server by instanceid or ipaddress, or None"""
+        server = self.by_instanceid.get(address)
+        if server is None:
+            server = self.by_ipaddress.get(address)
+        return server
+
+    def instanceids(self):
+        return set(self.by_instanceid)
+
+    def group_by(self, attr):
+        """Return a dict mapping each value of <attr> (e.g., status, region
+        or name) to a ServerCollection of the servers that have it"""
+        groups = self._groups.get(attr)
+        if groups is None:
+            groups = {}
+            for server in self:
+                groups.setdefault(getattr(server, attr), ServerCollection()).append(server)
+            self._groups[attr] = groups
+        return groups
+
+    def changed(self, other, attrs=('status', 'boot_status', 'ipaddress')):
+        """Return servers in both collections whose <attrs> differ in <other>"""
+        changed = ServerCollection()
+        for server in self:
+            previous = other.by_instanceid.get(server.instanceid)
+            if previous is None:
+                continue
+
+            for attr in attrs:
+                if getattr(server, attr) != getattr(previous, attr):
+                    changed.append(server)
+                    break
+
+        return changed
+
+    def __sub__(self, other):
+        instanceids = other.instanceids()
+        return ServerCollection([ server for server in self
+                                  if server.instanceid not in instanceids ])
+
+    def __and__(self, other):
+        instanceids = other.instanceids()
+        return ServerCollection([ server for server in self
+                                  if server.instanceid in instanceids ])
+
+    def __or__(self, other):
+        return ServerCollection(list(self) + list(other - self))
+
+    def __add__(self, other):
+        return ServerCollection(list(self) + list(other))
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def append(self, server):
+        list.append(self, server)
+        self._invalidate()
+
+    def extend(self, servers):
+        list.extend(self, servers)
+        self._invalidate()
+
+    def insert(self, i, server):
+        list.insert(self, i, server)
+        self._invalidate()
+
+    def remove(self, server):
+        list.remove(self, server)
+        self._invalidate()
+
+    def pop(self, *args):
+        server = list.pop(self, *args)
+        self._invalidate()
+        return server
+
+    def clear(self):
+        list.clear(self)
+        self._invalidate()
+
+    def __setitem__(self, i, val):
+        list.__setitem__(self, i, val)
+        self._invalidate()
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self._invalidate()
+
 class Servers(object):
+    # (see watch)
+    WATCH_ATTRS = ('status', 'boot_status', 'ipaddress')
+    WATCH_BACKOFF = 1.5
+
+    # (see wait_each)
+    WAIT_FIRST = 5
+    WAIT = 10
+    WAIT_MAX = 30
+    WAIT_BACKOFF = 1.5
+
+    class Error(Exception):
+        pass
+
+    class Timeout(Error):
+        pass
+
     def __init__(self, api):
         self.api = api
 
-    def get(self, instanceid=None, refresh_cache=False):
+    def _request(self, instanceid, refresh_cache, stream, filters):
+        """Return (predicate, response) for get() and iter()"""
+        match = _server_filter(**filters)
         attrs = {'refresh_cache': refresh_cache}
-        if instanceid:
-            r = self.api('GET', 'amazon/instance/%s/' % instanceid, attrs)
-        else:
-            r = self.api('GET', 'amazon/instances/', attrs)
 
-        return [ Server(self.api, server) for server in r ]
+        # a single instance has its own, much smaller, endpoint
+        instanceids = _selected(filters['instanceids'])
+        if not instanceid and instanceids is not None and len(instanceids) == 1:
+            instanceid = list(instanceids)[0]
+
+        if not instanceid:
+            return match, self.api('GET', 'amazon/instances/', attrs, stream=stream)
+
+        if instanceids is not None and instanceid not in instanceids:
+            return match, []
+
+        try:
+            return match, self.api('GET', 'amazon/instance/%s/' % instanceid, attrs)
+        except API.Error as e:
+            # filtering for an instance that doesn't exist isn't an error
+            if instanceids is None or e.code != 404:
+                raise
+            return match, []
+
+    def get(self, instanceid=None, refresh_cache=False, raw=False,
+            status=None, region=None, name=None, instanceids=None,
+            addresses=None, label_prefix=None):
+        """Return a ServerCollection. If <raw>, servers keep their raw API response
+
+        filters (optional, all but label_prefix take a value or a collection):
+
+            status       - Amazon EC2 reported status (e.g., running)
+            region       - region (e.g., us-east-1)
+            name         - appliance code name (e.g., core)
+            instanceids  - instance IDs
+            addresses    - instance IDs or IP addresses
+            label_prefix - label starts with this string
+
+        Filters are applied to the API response before servers are built.
+        """
+        match, r = self._request(instanceid, refresh_cache, False,
+                                 dict(status=status, region=region, name=name,
+                                      instanceids=instanceids, addresses=addresses,
+                                      label_prefix=label_prefix))
+        if match:
+            r = filter(match, r)
+
+        return ServerCollection([ Server(self.api, server, raw) for server in r ])
+
+    def iter(self, instanceid=None, refresh_cache=False, raw=False,
+             status=None, region=None, name=None, instanceids=None,
+             addresses=None, label_prefix=None):
+        """Like get(), but yield servers as the response is decoded"""
+        match, r = self._request(instanceid, refresh_cache, True,
+                                 dict(status=status, region=region, name=name,
+                                      instanceids=instanceids, addresses=addresses,
+                                      label_prefix=label_prefix))
+        if match:
+            r = filter(match, r)
+
+        for server in r:
+            yield Server(self.api, server, raw)
+
+    @staticmethod
+    def _transitional(server):
+        if server.status in ('pending', 'stopping', 'shutting-down'):
+            return True
+        return server.status == 'running' and server.boot_status != 'booted'
+
+    def watch(self, interval=30, fast_interval=5, refresh_cache=False, raw=False,
+              **filters):
+        """Poll the server list, a single request per tick, and yield
+        (event, server) for each server added, removed or changed (in one
+        of WATCH_ATTRS) since the previous tick. event is 'added', 'removed'
+        or 'changed'. The first tick yields every server as added.
+
+        Ticks are <fast_interval> seconds apart while any server is pending
+        or not yet booted, or after a change, backing off towards
+        <interval> while nothing changes. filters are as for get().
+        """
+        previous = ServerCollection()
+        wait = fast_interval
+        while True:
+            current = self.get(refresh_cache=refresh_cache, raw=raw, **filters)
+
+            events = [ ('added', server) for server in current - previous ] + \
+                     [ ('removed', server) for server in previous - current ] + \
+                     [ ('changed', server)
+                       for server in current.changed(previous, self.WATCH_ATTRS) ]
+            previous = current
+
+            for event in events:
+                yield event
+
+            if events or any([ self._transitional(server) for server in current ]):
+                wait = fast_interval
+            else:
+                wait = min(wait * self.WATCH_BACKOFF, interval)
+
+            time.sleep(wait)
+
+    def wait_each(self, servers, status='running', boot_status=None, timeout=None,
+                  wait_first=WAIT_FIRST, wait=WAIT, wait_max=WAIT_MAX):
+        """Poll <servers> until each has <status> (and <boot_status>, if
+        given), yielding each server as it gets there. Servers are updated
+        in place as they are polled.
+
+        Polls are full list refreshes shared (see ListPoller) by every
+        waiter on the account, including concurrent wait_each and
+        Server.wait_for calls, so waiting costs a single request per tick
+        however many servers and waiters there are. The first poll is
+        <wait_first> seconds in, then every <wait> seconds, backing off
+        towards <wait_max> while nothing changes. Raises Servers.Timeout
+        after <timeout> seconds, or Servers.Error if a server is
+        terminated or disappears first.
+        """
+        from .poller import ListPoller
+
+        started = time.time()
+        deadline = None if timeout is None else started + timeout
+        poller = ListPoller.shared(self.api)
+
+        waiting = {}
+        for server in servers:
+            if _reached(server, status, boot_status):
+                yield server
+            else:
+                waiting[server.instanceid] = server
+
+        due = started + wait_first
+        interval = wait
+        while waiting:
+            now = time.time()
+            if now >= due:
+                # a refresh another waiter started in the last half interval will do
+                polled, stamp = poller.snapshot(self.api, max(started, due - interval / 2.0))
+
+                reached, changed, error = _wait_poll(waiting, polled, status, boot_status)
+                for server in reached:
+                    yield server
+
+                if error:
+                    raise error
+
+                if not waiting:
+                    break
+
+                interval = wait if changed else min(interval * self.WAIT_BACKOFF, wait_max)
+                due = stamp + interval
+
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                raise _wait_timeout(waiting, status, boot_status)
+
+            wake = due if deadline is None else min(due, deadline)
+            time.sleep(max(0, wake - now))
+
+    def wait_all(self, servers, status='running', boot_status=None, timeout=None,
+                 **kwargs):
+        """Wait until all <servers> have <status> (see wait_each).
+        Returns them as a ServerCollection, in the order they got there"""
+        return ServerCollection(self.wait_each(servers, status, boot_status,
+                                               timeout, **kwargs))
 
     def launch(self, name, region="us-east-1", size="m1.small", type="ebs",
                arch="amd64", label="", **kwargs):
@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import threading
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight(object):
+    """Coalesces concurrent identical calls.
+
+    While a call for a key is in flight, other threads calling with the
+    same key wait for it and get its result (or exception) instead of
+    making the call themselves. Keys are forgotten as soon as the call
+    completes, so results are never reused after the fact.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'calls': 0, 'coalesced': 0}
+
+    def call(self, key, callable):
+        with self._lock:
+            self._stats['calls'] += 1
+
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = callable()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def stats(self):
+        """Return a dict of calls and coalesced (i.e., saved) call counts"""
+        with self._lock:
+            return dict(self._stats)
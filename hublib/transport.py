@@ -0,0 +1,313 @@
+#
+# Copyright (c) 2022 TurnKey GNU/Linux <admin@turnkeylinux.org>
+#
+# This file is part of HubTools.
+#
+# HubTools is free software; you can redistribute it and/or modify it
+# under the terms of the GNU General Public License as published by the
+# Free Software Foundation; either version 3 of the License, or (at your
+# option) any later version.
+#
+import json
+import queue
+import codecs
+import threading
+
+from io import BytesIO
+from collections import deque
+from urllib.parse import urlencode
+
+import pycurl
+
+from py3curl_wrapper import API
+
+ALL_OK = 200
+CREATED = 201
+DELETED = 204
+
+def decode_response(code, data):
+    """decode a Hub API response body the way py3curl_wrapper.API does"""
+    data = data.decode('utf-8')
+    if code not in (ALL_OK, CREATED, DELETED):
+        name, description = data.split(":", 1)
+        raise API.Error(code, name, description.strip())
+
+    if code == DELETED:
+        return True
+
+    return json.loads(data)
+
+def iter_json_array(chunks):
+    """Incrementally decode a JSON array from an iterable of byte chunks,
+    yielding its elements as soon as each one is complete"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    buf = ''
+    pos = 0
+    started = False
+
+    # a value may follow '[' or ',', and ',' or ']' may follow a value
+    expect_value = True
+    empty = True
+
+    chunks = iter(chunks)
+    eof = False
+    while True:
+        # elements are only taken once followed by a delimiter, so a
+        # value split across chunks isn't mistaken for a shorter one
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+
+            if pos == len(buf):
+                break
+
+            if not started:
+                if buf[pos] != '[':
+                    # not an array after all
+                    rest = buf[pos:]
+                    if not eof:
+                        rest += ''.join([ utf8.decode(chunk) for chunk in chunks ])
+                    rest += utf8.decode(b'', final=True)
+                    yield json.loads(rest)
+                    return
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == ']':
+                if expect_value and not empty:
+                    raise ValueError("malformed JSON array at char %d: trailing ','" % pos)
+
+                # finish the transfer so its connection can be reused,
+                # checking nothing follows the array
+                rest = buf[pos + 1:]
+                if not eof:
+                    rest += ''.join([ utf8.decode(chunk) for chunk in chunks ])
+                rest += utf8.decode(b'', final=True)
+                if rest.strip():
+                    raise ValueError("extra data after JSON array")
+                return
+
+            if buf[pos] == ',':
+                if expect_value:
+                    raise ValueError("malformed JSON array at char %d: unexpected ','" % pos)
+                expect_value = True
+                pos += 1
+                continue
+
+            try:
+                val, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                break
+
+            tail = end
+            while tail < len(buf) and buf[tail] in ' \t\r\n':
+                tail += 1
+            if tail == len(buf) or buf[tail] not in ',]':
+                # e.g., 1e of 1e5
+                if not eof:
+                    break
+                raise ValueError("malformed JSON array at char %d" % tail)
+
+            expect_value = False
+            empty = False
+
+            yield val
+            pos = end
+
+        if eof:
+            raise ValueError("truncated JSON array")
+
+        buf = buf[pos:]
+        pos = 0
+
+        try:
+            buf += utf8.decode(next(chunks))
+        except StopIteration:
+            buf += utf8.decode(b'', final=True)
+            eof = True
+
+class CurlPool(object):
+    """Thread-safe pool of persistent curl handles.
+
+    Handles are reset (not recreated) between requests so libcurl keeps
+    their live connections, and a share object lets every handle in the
+    pool reuse the same DNS cache, TLS sessions and connection cache.
+    At most <size> requests are in flight at once; further callers block
+    until a handle is returned to the pool.
+    """
+
+    Error = API.Error
+
+    def __init__(self, size=4, timeout=None, verbose=False):
+        self.size = size
+        self.timeout = timeout
+        self.verbose = verbose
+
+        self._share = pycurl.CurlShare()
+        for data in ('LOCK_DATA_DNS', 'LOCK_DATA_SSL_SESSION', 'LOCK_DATA_CONNECT'):
+            if hasattr(pycurl, data):
+                self._share.setopt(pycurl.SH_SHARE, getattr(pycurl, data))
+
+        self._handles = queue.LifoQueue()
+        for i in range(size):
+            self._handles.put(None)
+
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'connects': 0, 'reused': 0}
+
+    def _acquire(self):
+        c = self._handles.get()
+        if c is None:
+            c = pycurl.Curl()
+            c.setopt(pycurl.SHARE, self._share)
+        else:
+            # reset keeps live connections, caches and the share
+            c.reset()
+
+        c.setopt(pycurl.NOSIGNAL, 1)
+        c.setopt(pycurl.TCP_KEEPALIVE, 1)
+        if self.timeout:
+            c.setopt(pycurl.TIMEOUT, int(self.timeout))
+        if self.verbose:
+            c.setopt(pycurl.VERBOSE, 1)
+
+        return c
+
+    def _release(self, c):
+        self._handles.put(c)
+
+    @staticmethod
+    def _setopts(c, method, url, attrs, headers):
+        data = urlencode(attrs)
+        if method in ('GET', 'DELETE'):
+            if data:
+                url += '?' + data
+        else:
+            c.setopt(pycurl.POSTFIELDS, data)
+
+        if method != 'GET' and method != 'POST':
+            c.setopt(pycurl.CUSTOMREQUEST, method)
+
+        c.setopt(pycurl.URL, url)
+        c.setopt(pycurl.HTTPHEADER,
+                 [ "%s: %s" % (name, val) for name, val in headers.items() ])
+
+    def _count(self, connects):
+        with self._lock:
+            self._stats['requests'] += 1
+            if connects:
+                self._stats['connects'] += connects
+            else:
+                self._stats['reused'] += 1
+
+    @staticmethod
+    def _info(c, info):
+        # headers included, so these are roughly the bytes on the wire
+        info['bytes_in'] = int(c.getinfo(pycurl.HEADER_SIZE) +
+                               c.getinfo(pycurl.SIZE_DOWNLOAD))
+        info['bytes_out'] = int(c.getinfo(pycurl.REQUEST_SIZE) +
+                                c.getinfo(pycurl.SIZE_UPLOAD))
+
+    def request(self, method, url, attrs={}, headers={}, info=None):
+        """If a dict is given as <info>, bytes_in and bytes_out are set in it"""
+        c = self._acquire()
+        try:
+            buf = BytesIO()
+            self._setopts(c, method, url, attrs, headers)
+            c.setopt(pycurl.WRITEFUNCTION, buf.write)
+
+            c.perform()
+
+            code = c.getinfo(pycurl.RESPONSE_CODE)
+            connects = c.getinfo(pycurl.NUM_CONNECTS)
+            if info is not None:
+                self._info(c, info)
+        except pycurl.error:
+            # don't put a handle in an unknown state back into the pool
+            c.close()
+            c = None
+            raise
+        finally:
+            self._release(c)
+
+        self._count(connects)
+        return decode_response(code, buf.getvalue())
+
+    def stream(self, method, url, attrs={}, headers={}, info=None):
+        """Like request(), but yields the raw response body in chunks as
+        they arrive. Error responses are raised once fully received"""
+        chunks = deque()
+
+        c = self._acquire()
+        m = pycurl.CurlMulti()
+        try:
+            self._setopts(c, method, url, attrs, headers)
+            c.setopt(pycurl.WRITEFUNCTION, chunks.append)
+            m.add_handle(c)
+
+            code = None
+            active = 1
+            while active:
+                ret, active = m.perform()
+                while ret == pycurl.E_CALL_MULTI_PERFORM:
+                    ret, active = m.perform()
+
+                if code is None and chunks:
+                    code = c.getinfo(pycurl.RESPONSE_CODE)
+
+                if code in (ALL_OK, CREATED):
+                    while chunks:
+                        yield chunks.popleft()
+
+                if active:
+                    m.select(1.0)
+
+            queued, ok, failed = m.info_read()
+            if failed:
+                handle, errno, errmsg = failed[0]
+                raise pycurl.error(errno, errmsg)
+
+            code = c.getinfo(pycurl.RESPONSE_CODE)
+            connects = c.getinfo(pycurl.NUM_CONNECTS)
+            if info is not None:
+                self._info(c, info)
+        except BaseException:
+            # closing also detaches the handle from the multi
+            c.close()
+            c = None
+            raise
+        finally:
+            if c is not None:
+                m.remove_handle(c)
+            m.close()
+            self._release(c)
+
+        self._count(connects)
+
+        body = b''.join(chunks)
+        if code not in (ALL_OK, CREATED):
+            decode_response(code, body)
+        elif body:
+            yield body
+
+    def stats(self):
+        """Return a dict of request, new connection and reused connection counts"""
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        while True:
+            try:
+                c = self._handles.get_nowait()
+            except queue.Empty:
+                break
+
+            if c is not None:
+                c.close()
+
+        self._share.close()
@@ -3,3 +3,8 @@ import sys
 def fatal(e):
     print("error: " + str(e), file=sys.stderr)
     sys.exit(1)
+
+def print_stats(hub):
+    """Print a summary of <hub>'s API requests to stderr (for --stats)"""
+    from .formatter import fmt_stats
+    print(fmt_stats(hub.stats()), file=sys.stderr)
@@ -9,7 +9,8 @@ setup(
     author_email="jeremy@turnkeylinux.org",
     url="https://github.com/turnkeylinux/hubtools",
     packages=["hublib"],
-    scripts=["hub_destroy.py",
+    scripts=["hub.py",
+             "hub_destroy.py",
              "hub_launch.py",
              "hub_list_appliances.py",
              "hub_list_backups.py",
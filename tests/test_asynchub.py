@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from hublib.asynchub import AsyncAPI
+
+async def serve(responses):
+    """Start an HTTP/1.1 server that sends <responses> in turn on one
+    keep-alive connection, recording the requests it gets"""
+    requests = []
+
+    async def handle(reader, writer):
+        for response in responses:
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = [ int(line.split(b':')[1]) for line in head.split(b'\r\n')
+                       if line.lower().startswith(b'content-length:') ]
+            body = await reader.readexactly(length[0]) if length else b''
+            requests.append((head.split(b'\r\n')[0], body))
+
+            writer.write(response)
+            await writer.drain()
+
+        # keep the connection open, like a keep-alive server would
+        await reader.read()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()[1], requests
+
+def test_no_content_keepalive():
+    async def main():
+        server, port, requests = await serve([
+            b'HTTP/1.1 204 No Content\r\n\r\n',
+            b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n[]',
+        ])
+
+        api = AsyncAPI(timeout=2)
+        url = 'http://127.0.0.1:%d/api/amazon/instance/i-1/unregister/' % port
+        try:
+            deleted = await api.request('DELETE', url, {'force': 1})
+            listed = await api.request('GET', 'http://127.0.0.1:%d/api/amazon/instances/' % port)
+        finally:
+            await api.close()
+            server.close()
+
+        return deleted, listed, requests
+
+    deleted, listed, requests = asyncio.run(main())
+
+    assert deleted is True
+    assert listed == []
+
+    # both went over the one connection, DELETE attrs in the query string
+    assert requests == [
+        (b'DELETE /api/amazon/instance/i-1/unregister/?force=1 HTTP/1.1', b''),
+        (b'GET /api/amazon/instances/ HTTP/1.1', b''),
+    ]
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'[]')
+
+    def log_message(self, *args):
+        pass
+
+def test_reuse_across_event_loops():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    api = AsyncAPI(timeout=2)
+    url = 'http://127.0.0.1:%d/api/amazon/instances/' % httpd.server_port
+    try:
+        # the first loop leaves an idle keep-alive connection behind
+        assert asyncio.run(api.request('GET', url)) == []
+
+        async def second():
+            try:
+                return await api.request('GET', url)
+            finally:
+                await api.close()
+
+        assert asyncio.run(second()) == []
+        assert api._idle == {}
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
@@ -0,0 +1,17 @@
+import datetime
+
+from hublib.formatter import Formatter
+
+def test_fields():
+    format = Formatter('%status %{instanceid} %{size:>6,d} %%')
+    assert format({'status': 'running', 'instanceid': 'i-1', 'size': 1234}) == \
+        'running i-1  1,234 %'
+
+def test_spec_on_none():
+    format = Formatter('%{ipaddress:<15}|%{updated:%Y-%m-%d}|%{size:>6,d}|%{label:.5}|%name')
+    assert format({'ipaddress': None, 'updated': None, 'size': None,
+                   'label': None, 'name': None}) == ' ' * 15 + '||      ||None'
+
+    assert format({'ipaddress': '10.0.0.1', 'updated': datetime.date(2022, 1, 2),
+                   'size': 1024, 'label': 'a long label', 'name': 'core'}) == \
+        '10.0.0.1       |2022-01-02| 1,024|a lon|core'
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from hublib.transport import iter_json_array
+
+BODIES = [
+    b'[]',
+    b' [ ] ',
+    b'[1]',
+    b'[1e5, -2.5E-3, 0, 10]',
+    b'["a,b]", "\\"]", "caf\xc3\xa9 \xe2\x82\xac"]',
+    b'[{"a": [1, 2], "b": {"c": null}}, true, false, null]',
+    b'[\n  {"instanceid": "i-1"},\n  {"instanceid": "i-2"}\n]\n',
+    b'{"not": "an array"}',
+]
+
+MALFORMED = [
+    b'[1,,2]',
+    b'[,1]',
+    b'[1,]',
+    b'[,]',
+    b'[1 2]',
+    b'[1',
+    b'[1,',
+    b'[1] 2',
+    b'[1}',
+    b'[{"a": 1]',
+]
+
+def splits(body):
+    """Yield <body> split into two and into single byte chunks"""
+    for i in range(len(body) + 1):
+        yield [body[:i], body[i:]]
+    yield [ body[i:i + 1] for i in range(len(body)) ]
+
+def decode(chunks):
+    return list(iter_json_array(chunks))
+
+@pytest.mark.parametrize('body', BODIES)
+def test_every_chunk_boundary(body):
+    expected = json.loads(body.decode('utf-8'))
+    if not isinstance(expected, list):
+        expected = [expected]
+
+    for chunks in splits(body):
+        assert decode(chunks) == expected, chunks
+
+@pytest.mark.parametrize('body', MALFORMED)
+def test_malformed(body):
+    for chunks in splits(body):
+        with pytest.raises(ValueError):
+            decode(chunks)
+
+def test_drains_chunks():
+    consumed = []
+    def chunks():
+        for chunk in (b'[1', b']', b'', b'  '):
+            consumed.append(chunk)
+            yield chunk
+
+    assert decode(chunks()) == [1]
+    assert len(consumed) == 4
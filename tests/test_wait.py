@@ -0,0 +1,113 @@
+import gc
+import time
+import weakref
+import asyncio
+import threading
+
+from hublib.servers import Servers, Server
+from hublib.asynchub import AsyncServer, AsyncServers
+
+def response(instanceid, status='pending', boot_status=''):
+    return {'instanceid': instanceid, 'type': 'm1.small', 'region': 'us-east-1',
+            'ipaddress': '10.0.0.1', 'status': status, 'ebs_backed': True,
+            'server': {'name': 'core', 'boot_status': boot_status,
+                       'description': '', 'serverid': 1}}
+
+class FakeAPI(object):
+    """Serves a server list whose servers boot after <boot> requests"""
+
+    def __init__(self, instanceids, boot=3):
+        self.instanceids = instanceids
+        self.boot = boot
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def status(self):
+        if len(self.requests) >= self.boot:
+            return 'running', 'booted'
+        return 'pending', ''
+
+    def __call__(self, method, uri, attrs={}, stream=False):
+        with self.lock:
+            self.requests.append((method, uri))
+            status, boot_status = self.status()
+
+        if uri == 'amazon/instances/':
+            return [ response(instanceid, status, boot_status)
+                     for instanceid in self.instanceids ]
+
+        return [ response(uri.split('/')[2], status, boot_status) ]
+
+KW = dict(wait_first=0.05, wait=0.05, wait_max=0.05)
+
+def test_wait_all_one_request_per_tick():
+    api = FakeAPI(['i-1', 'i-2', 'i-3'])
+    servers = [ Server(api, response(instanceid)) for instanceid in api.instanceids ]
+
+    waited = Servers(api).wait_all(servers, 'running', 'booted', timeout=5, **KW)
+
+    assert len(waited) == 3
+    assert all([ server.boot_status == 'booted' for server in servers ])
+    assert api.requests == [('GET', 'amazon/instances/')] * api.boot
+
+def test_concurrent_waiters_share_refreshes():
+    api = FakeAPI(['i-%d' % i for i in range(8)], boot=4)
+    servers = [ Server(api, response(instanceid)) for instanceid in api.instanceids ]
+
+    threads = [ threading.Thread(target=server.wait_for,
+                                 args=('running', 'booted', 5),
+                                 kwargs=dict(wait_first=0.05, wait=0.2, wait_max=0.2))
+                for server in servers ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all([ server.boot_status == 'booted' for server in servers ])
+    assert set(api.requests) == set([('GET', 'amazon/instances/')])
+    assert len(api.requests) == api.boot
+
+def test_poller_doesnt_keep_api_alive():
+    api = FakeAPI(['i-1'], boot=1)
+    servers = [ Server(api, response('i-1')) ]
+    Servers(api).wait_all(servers, 'running', timeout=5, **KW)
+
+    ref = weakref.ref(api)
+    del api, servers
+    gc.collect()
+
+    assert ref() is None
+
+def test_async_wait_for():
+    api = FakeAPI(['i-1'])
+    async def async_api(method, uri, attrs={}):
+        return api(method, uri, attrs)
+
+    server = AsyncServer(async_api, response('i-1'))
+
+    started = time.time()
+    result = asyncio.run(server.wait_for('running', 'booted', timeout=5, **KW))
+
+    assert result is server and server.boot_status == 'booted'
+    assert len(api.requests) == api.boot
+    assert time.time() - started < 1
+
+def test_async_waiters_share_refreshes():
+    api = FakeAPI(['i-%d' % i for i in range(8)], boot=4)
+    async def async_api(method, uri, attrs={}):
+        await asyncio.sleep(0.01)
+        return api(method, uri, attrs)
+
+    servers = [ AsyncServer(async_api, response(instanceid))
+                for instanceid in api.instanceids ]
+
+    async def main():
+        return await asyncio.gather(
+            AsyncServers(async_api).wait_all(servers[4:], 'running', 'booted', 5, **KW),
+            *[ server.wait_for('running', 'booted', 5, **KW) for server in servers[:4] ])
+
+    waited = asyncio.run(main())[0]
+
+    assert len(waited) == 4
+    assert all([ server.boot_status == 'booted' for server in servers ])
+    assert api.requests == [('GET', 'amazon/instances/')] * api.boot